@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from app.utils.audit_log import audit_log
+
+router = APIRouter()
+
+@router.get("/log")
+async def read_audit_log(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    workspace_name: Optional[str] = None
+):
+    """
+    Page through the upload audit log, newest records first.
+
+    Pass the returned ``next_cursor`` as ``cursor`` for the next page.
+    """
+    try:
+        page = await run_in_threadpool(audit_log.read, cursor, limit, workspace_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", **page}
@@ -1,12 +1,25 @@
-from fastapi import APIRouter, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Form, File, UploadFile
 from fastapi.responses import Response
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+import asyncio
 import json
-from app.core.security import encrypt_data
+import logging
+from app.core.config import settings
+from app.core.memory import reserved_post
+from app.core.security import encrypt_data_async
+from app.services.config_files import (
+    CONFLICT_POLICIES,
+    WorkspaceConflictError,
+    decrypt_config_file,
+    merge_workspaces,
+    read_key_file
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/encrypt")
+# The config may combine as many key files as a merge
+@reserved_post(router, "/encrypt", max_files=settings.COMBINE_MAX_FILES)
 async def encrypt_combined_config(
     pin: str = Form(...),
     filename: str = Form(...),
@@ -27,7 +40,7 @@ async def encrypt_combined_config(
         json_data = json.dumps(config_data)
         
         # Encrypt the configuration
-        encrypted_data = encrypt_data(json_data, pin)
+        encrypted_data = await encrypt_data_async(json_data, pin)
         
         # Return as downloadable file
         return Response(
@@ -48,3 +61,89 @@ async def encrypt_combined_config(
             status_code=500,
             detail=f"Error encrypting configuration: {str(e)}"
         )
+
+@reserved_post(router, "/merge", max_files=settings.COMBINE_MAX_FILES)
+async def merge_encrypted_configs(
+    files: List[UploadFile] = File(...),
+    pins: List[str] = Form(...),
+    pin: str = Form(...),
+    filename: str = Form(...),
+    conflict: str = Form("error"),
+    workspaces: Optional[List[str]] = Form(None)
+):
+    """
+    Combine several encrypted .mydre files into one, entirely server-side.
+
+    ``pins`` holds one PIN per file (or a single PIN for all files) and
+    ``pin`` is the PIN for the combined file. ``conflict`` sets how a
+    workspace defined differently in two files is handled (``error``,
+    ``first`` or ``last``); ``workspaces`` optionally limits the result to
+    the named workspaces.
+    """
+    if len(pin) < 6:
+        raise HTTPException(
+            status_code=400,
+            detail="PIN must be at least 6 characters long"
+        )
+    if conflict not in CONFLICT_POLICIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Conflict policy must be one of: {', '.join(CONFLICT_POLICIES)}"
+        )
+    if len(files) > settings.COMBINE_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.COMBINE_MAX_FILES} files can be merged per request"
+        )
+    if len(pins) == 1:
+        pins = pins * len(files)
+    if len(pins) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide one PIN per file or a single PIN for all files"
+        )
+
+    contents = [await read_key_file(file) for file in files]
+    results = await asyncio.gather(
+        *(decrypt_config_file(content, file_pin) for content, file_pin in zip(contents, pins)),
+        return_exceptions=True
+    )
+    failed = [
+        f"{file.filename}: {str(result)}"
+        for file, result in zip(files, results)
+        if isinstance(result, Exception)
+    ]
+    if failed:
+        logger.error(f"Merge aborted, could not decrypt: {failed}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Decryption failed for {'; '.join(failed)}"
+        )
+
+    try:
+        merged = merge_workspaces(results, conflict, workspaces)
+    except WorkspaceConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if not merged:
+        raise HTTPException(
+            status_code=400,
+            detail="No workspaces found to combine"
+        )
+
+    try:
+        encrypted_data = await encrypt_data_async(json.dumps({"workspaces": merged}), pin)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error encrypting configuration: {str(e)}"
+        )
+
+    logger.info(f"Merged {len(files)} files into {len(merged)} workspaces")
+    return Response(
+        content=encrypted_data,
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
+    )
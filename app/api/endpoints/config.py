@@ -1,7 +1,12 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from fastapi.responses import JSONResponse, Response
-from app.core.security import decrypt_data, encrypt_data
+from app.core.config import settings
+from app.core.memory import reserved_post
+from app.core.security import decrypt_data_async, encrypt_data_async, key_cache
+from app.services.config_files import decrypt_config_file, normalize_config, read_key_file
 from pydantic import BaseModel
+from typing import List
+import asyncio
 import json
 import base64
 import logging
@@ -65,7 +70,7 @@ async def create_config(config: ConfigCreate):
         json_data = json.dumps(config_data)
         
         # Encrypt configuration data
-        encrypted_data = encrypt_data(json_data, config.pin)
+        encrypted_data = await encrypt_data_async(json_data, config.pin)
         
         # Create safe filename
         safe_workspace_name = sanitize_filename(config.workspace_name)
@@ -88,7 +93,7 @@ async def create_config(config: ConfigCreate):
             detail=f"Error creating configuration: {str(e)}"
         )
 
-@router.post("/decrypt")
+@reserved_post(router, "/decrypt")
 async def decrypt_config(
     file: UploadFile = File(...),
     pin: str = Form(...)
@@ -99,12 +104,12 @@ async def decrypt_config(
         logger.debug(f"PIN length: {len(pin)}")
         
         # Read the file content
-        file_content = await file.read()
+        file_content = await read_key_file(file)
         logger.debug(f"File content length: {len(file_content)}")
         
         try:
             # Decrypt the file content using the PIN
-            decrypted_data = decrypt_data(file_content, pin)
+            decrypted_data = await decrypt_data_async(file_content, pin)
             logger.debug("Decryption successful")
         except Exception as decrypt_error:
             logger.error(f"Decryption failed: {str(decrypt_error)}")
@@ -124,23 +129,10 @@ async def decrypt_config(
                 detail="Invalid JSON format in decrypted data"
             )
         
-        # Return the entire config structure
-        if 'workspaces' in config:
-            logger.debug(f"Returning full workspaces structure with {len(config['workspaces'])} workspaces")
-            return config
-        else:
-            # Handle single workspace format by wrapping it in workspaces structure
-            logger.debug("Converting single workspace to workspaces structure")
-            workspace_name = config.get('workspace_name', 'Workspace')
-            return {
-                "workspaces": {
-                    workspace_name: {
-                        "workspace_key": config['workspace_key'],
-                        "subscription_key": config['subscription_key'],
-                        "uploader_name": config['uploader_name']
-                    }
-                }
-            }
+        # Return the entire config structure, wrapping the single workspace format
+        config = normalize_config(config)
+        logger.debug(f"Returning workspaces structure with {len(config['workspaces'])} workspaces")
+        return config
 
     except HTTPException:
         raise
@@ -149,4 +141,64 @@ async def decrypt_config(
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+async def _decrypt_one(file: UploadFile, pin: str) -> dict:
+    """Decrypt a single file for the batch endpoint, capturing errors per file."""
+    try:
+        file_content = await read_key_file(file)
+        config = await decrypt_config_file(file_content, pin)
+        return {
+            "filename": file.filename,
+            "status": "success",
+            "config": config
+        }
+    except Exception as e:
+        logger.error(f"Batch decryption of {file.filename} failed: {str(e)}")
+        return {
+            "filename": file.filename,
+            "status": "error",
+            "message": str(e)
+        }
+
+@reserved_post(router, "/decrypt-batch", max_files=settings.DECRYPT_BATCH_MAX_FILES)
+async def decrypt_config_batch(
+    files: List[UploadFile] = File(...),
+    pins: List[str] = Form(...)
+):
+    """
+    Decrypt several .mydre files in one request.
+
+    Send one ``pins`` value per file (in the same order), or a single PIN
+    that is used for every file. Key derivations run in parallel in the KDF
+    pool and each file gets its own result, so one bad PIN does not fail
+    the whole batch.
+    """
+    if len(pins) == 1:
+        pins = pins * len(files)
+    if len(pins) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide one PIN per file or a single PIN for all files"
+        )
+    if len(files) > settings.DECRYPT_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.DECRYPT_BATCH_MAX_FILES} files can be decrypted per request"
+        )
+
+    logger.debug(f"Batch decrypting {len(files)} files")
+    results = await asyncio.gather(
+        *(_decrypt_one(file, pin) for file, pin in zip(files, pins))
+    )
+    return {
+        "status": "success",
+        "results": results
+    }
+
+@router.delete("/key-cache")
+async def flush_key_cache():
+    """Drop all cached PIN-derived keys."""
+    flushed = key_cache.flush()
+    logger.info(f"Flushed {flushed} cached keys")
+    return {"status": "success", "flushed": flushed}
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from datetime import date, datetime
+from typing import Optional
+from app.services.history import GROUPS, history_store
+
+router = APIRouter()
+
+@router.get("")
+async def list_history(
+    workspace_name: Optional[str] = None,
+    uploader_name: Optional[str] = None,
+    job_id: Optional[str] = None,
+    outcome: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = None
+):
+    """
+    List file uploads, newest first, filtered by workspace, uploader, job,
+    outcome and time range (``since`` inclusive, ``until`` exclusive).
+
+    Pass the returned ``next_cursor`` as ``cursor`` for the next page.
+    """
+    page = await run_in_threadpool(
+        history_store.query,
+        limit=limit,
+        before_id=cursor,
+        workspace_name=workspace_name,
+        uploader_name=uploader_name,
+        job_id=job_id,
+        outcome=outcome,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None
+    )
+    return {"status": "success", **page}
+
+@router.get("/aggregate")
+async def aggregate_history(
+    group_by: str = "workspace,day",
+    workspace_name: Optional[str] = None,
+    uploader_name: Optional[str] = None,
+    outcome: Optional[str] = None,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None
+):
+    """
+    Files, uploaded bytes, errors and average duration per group.
+
+    ``group_by`` is a comma-separated list of ``workspace``, ``uploader``,
+    ``day`` and ``outcome``; days are UTC and the day range is inclusive.
+    """
+    groups = [group.strip() for group in group_by.split(",") if group.strip()]
+    unknown = [group for group in groups if group not in GROUPS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot group by {', '.join(unknown)}; use {', '.join(GROUPS)}"
+        )
+    totals = await run_in_threadpool(
+        history_store.aggregate,
+        list(dict.fromkeys(groups)),
+        workspace_name=workspace_name,
+        uploader_name=uploader_name,
+        outcome=outcome,
+        start_day=start_day,
+        end_day=end_day
+    )
+    return {"status": "success", "group_by": groups, "totals": totals}
@@ -0,0 +1,140 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.schemas.upload import Upload2MultiRequest
+from app.services.fanout import fan_out_upload
+from app.services.jobs import Job, job_manager
+from app.services.progress import ProgressMeter, format_sse
+from app.services.resume import resume_store
+from app.services.staging import staging_area, staging_session
+from app.utils.uploader import Upload
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Seconds between events when nothing changes, so proxies keep the stream open
+EVENT_KEEPALIVE = 15
+
+def _run_upload_job(job: Job, upload_data: Upload2MultiRequest, file_paths):
+    """
+    Job body: fan the files out to every workspace, reporting progress.
+
+    Each workspace's upload is resumable; a failed workspace's result
+    carries its ``resume_id``.
+    """
+    uploaders = []
+    for workspace in upload_data.workspaces:
+        name = workspace.workspace_name
+        resume_state = resume_store.create(
+            name, workspace.uploader_name, file_paths, upload_data.compression,
+            upload_data.bundle_small_files
+        )
+        # Not resumable through the API while this job is still running
+        resume_state.active = True
+        uploaders.append(Upload(
+            **workspace.model_dump(),
+            progress_callback=lambda file_name, bytes_sent, name=name: job.update_progress(name, file_name, bytes_sent),
+            cancel_event=job.cancel_event,
+            resume_state=resume_state,
+            job_id=job.id,
+            compression=upload_data.compression,
+            bundle=upload_data.bundle_small_files
+        ))
+    try:
+        results = fan_out_upload(
+            uploaders, [str(file_path) for file_path in file_paths],
+            max_workers=upload_data.max_workers
+        )
+    finally:
+        for uploader in uploaders:
+            uploader.resume_state.active = False
+    for result in results:
+        if result["status"] == "error":
+            job.errors.append(f"{result['workspace_name']}: {result['error']}")
+    return results
+
+@router.post("/upload", status_code=202)
+async def submit_upload_job(upload_data: Upload2MultiRequest, session: str = Depends(staging_session)):
+    """
+    Queue an upload of files staged in the caller's session to one or more
+    workspaces.
+
+    Returns a job ID immediately; poll ``GET /jobs/{job_id}`` for progress.
+    """
+    if not upload_data.workspaces:
+        raise HTTPException(status_code=400, detail="No workspaces selected")
+
+    file_paths = await run_in_threadpool(staging_area.resolve, session, upload_data.files)
+
+    sizes = {file_path.name: file_path.stat().st_size for file_path in file_paths}
+    job = Job("upload", total_bytes=sum(sizes.values()) * len(upload_data.workspaces), session=session)
+    for workspace in upload_data.workspaces:
+        for file_name, size in sizes.items():
+            job.add_file(workspace.workspace_name, file_name, size)
+
+    # Pinned while queued too, and released however the job ends
+    pinned = await run_in_threadpool(staging_area.pin_files, file_paths)
+    try:
+        job_manager.submit(job, lambda job: _run_upload_job(job, upload_data, file_paths))
+    except Exception:
+        staging_area.unpin(pinned)
+        raise
+    job.future.add_done_callback(lambda future: staging_area.unpin(pinned))
+    return {"status": "success", "job_id": job.id, "state": job.state}
+
+@router.get("")
+async def list_jobs(session: str = Depends(staging_session)):
+    """List the caller's session's jobs without their per-file progress."""
+    return {
+        "status": "success",
+        "jobs": [job.to_dict(include_files=False) for job in job_manager.list(session)]
+    }
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+async def _progress_events(job: Job, request: Request):
+    meter = ProgressMeter()
+    subscription = job.progress.subscribe()
+    try:
+        while True:
+            finished = job.finished
+            yield format_sse("done" if finished else "progress", meter.event(job.to_dict()))
+            if finished:
+                break
+            await subscription.wait(EVENT_KEEPALIVE)
+            if await request.is_disconnected():
+                break
+    finally:
+        job.progress.unsubscribe(subscription)
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Stream live progress of a job as Server-Sent Events.
+
+    Sends ``progress`` events with per-file and per-workspace bytes, the
+    current rate and an ETA, throttled to ``MYDRE_PROGRESS_INTERVAL_MS``,
+    and a final ``done`` event once the job has finished.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _progress_events(job, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; uploads stop at the next block or file."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "success", "job_id": job.id, "state": job.state}
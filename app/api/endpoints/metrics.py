@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from app.core.concurrency import api_limiter, blob_limiter
+from app.core.memory import memory_budget
+from app.core.security import kdf_pool, key_cache
+from app.services.history import history_store
+from app.services.jobs import job_manager
+from app.services.staging import staging_area
+from app.utils.audit_log import audit_log
+from app.utils.uploader import http_pool_stats
+
+router = APIRouter()
+
+@router.get("")
+async def get_metrics():
+    """Report pool, cache, memory budget, concurrency and queue statistics for monitoring."""
+    return {
+        "kdf_pool": kdf_pool.stats(),
+        "key_cache": key_cache.stats(),
+        "http_pool": http_pool_stats(),
+        "memory_budget": memory_budget.stats(),
+        "concurrency": {"blob": blob_limiter.stats(), "api": api_limiter.stats()},
+        "jobs": job_manager.stats(),
+        "audit_log": audit_log.stats(),
+        "history": history_store.stats(),
+        "staging": staging_area.stats()
+    }
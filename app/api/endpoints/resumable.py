@@ -0,0 +1,107 @@
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.schemas.upload import ResumeRequest
+from app.services.jobs import Job, job_manager
+from app.services.resume import ResumableUpload, resume_store
+from app.services.staging import staging_area
+from app.utils.uploader import Upload
+import logging
+import os
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def _run_resume_job(job: Job, state: ResumableUpload, credentials: ResumeRequest):
+    """Job body: finish an interrupted upload in its original container."""
+    uploader = Upload(
+        workspace_name=state.workspace_name,
+        workspace_key=credentials.workspace_key,
+        subscription_key=credentials.subscription_key,
+        uploader_name=state.uploader_name,
+        progress_callback=lambda file_name, bytes_sent: job.update_progress(state.workspace_name, file_name, bytes_sent),
+        cancel_event=job.cancel_event,
+        resume_state=state,
+        job_id=job.id,
+        compression=state.compression,
+        bundle=state.bundle
+    )
+    try:
+        uploader.create_workspace_container()
+        results = uploader.upload_files(state.file_paths())
+        failed = [result for result in results if result["status"] == "error"]
+        for result in failed:
+            job.errors.append(f"{result['file']}: {result['error']}")
+        if not failed:
+            uploader.upload_manifest()
+            uploader.commit_workspace_container()
+        return results
+    finally:
+        uploader.close_container_client()
+
+@router.get("")
+async def list_resumable_uploads():
+    """List interrupted uploads that can be resumed."""
+    return {
+        "status": "success",
+        "uploads": [upload.to_dict() for upload in resume_store.list()]
+    }
+
+@router.get("/{resume_id}")
+async def get_resumable_upload(resume_id: str):
+    state = resume_store.get(resume_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Resumable upload not found")
+    return state.to_dict()
+
+@router.post("/{resume_id}/resume", status_code=202)
+async def resume_upload(resume_id: str, credentials: ResumeRequest):
+    """
+    Resume an interrupted upload as a background job.
+
+    The upload continues in the container of the earlier attempt: files
+    already uploaded are skipped and large files only stage the blocks
+    that are missing. Poll or subscribe to the returned job for progress.
+    """
+    state = resume_store.get(resume_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Resumable upload not found")
+    if state.active:
+        raise HTTPException(status_code=409, detail="Upload is already being resumed")
+    for file_path in state.file_paths():
+        if not os.path.isfile(file_path):
+            logger.error(f"File not found: {file_path}")
+            raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+
+    state.active = True
+    job = Job("resume")
+    for upload_file in state.to_dict()["files"]:
+        job.add_file(state.workspace_name, upload_file["filename"], upload_file["size"])
+        job.total_bytes += upload_file["size"]
+    # Pinned while queued too, and released however the job ends
+    pinned = await run_in_threadpool(staging_area.pin_files, state.file_paths())
+    try:
+        job_manager.submit(job, lambda job: _run_resume_job(job, state, credentials))
+    except Exception:
+        staging_area.unpin(pinned)
+        state.active = False
+        raise
+
+    def finished(future):
+        # Also runs for a job cancelled while queued, whose body never runs
+        staging_area.unpin(pinned)
+        state.active = False
+
+    job.future.add_done_callback(finished)
+    logger.info(f"Resuming upload {resume_id} to workspace {state.workspace_name}")
+    return {"status": "success", "resume_id": resume_id, "job_id": job.id, "state": job.state}
+
+@router.delete("/{resume_id}")
+async def discard_resumable_upload(resume_id: str):
+    """Forget an interrupted upload; its uncommitted blocks expire on the server."""
+    state = resume_store.get(resume_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Resumable upload not found")
+    if state.active:
+        raise HTTPException(status_code=409, detail="Upload is being resumed")
+    resume_store.delete(resume_id)
+    return {"status": "success", "resume_id": resume_id}
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from ...utils.uploader import Upload
 import os
 import logging
-from datetime import datetime
 import tempfile
 import traceback
 import json
+import shutil
 
 # Configure logging properly
 logging.basicConfig(
@@ -17,11 +18,11 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def sanitize_filename(name):
-    """Sanitize the user name to create a valid filename."""
-    # Replace invalid characters with underscores
-    return ''.join(c if c.isalnum() or c in (' ', '_') else '_' for c in name)
 
+def _copy_to_path(source, path, chunk_size=1024 * 1024):
+    """Copy a file object to ``path`` in fixed-size chunks."""
+    with open(path, "wb") as target:
+        shutil.copyfileobj(source, target, chunk_size)
 
 
 @router.post("/workspace")
@@ -46,104 +47,41 @@ async def upload_to_workspace(
 
         # Initialize uploader
         uploader = Upload(
-            ws_name=workspace_name,
-            ws_description=f"Upload via web interface by {uploader_name}",
-            ws_key=workspace_key,
-            tenant_key=subscription_key,
-            user_name=uploader_name
+            workspace_name=workspace_name,
+            workspace_key=workspace_key,
+            subscription_key=subscription_key,
+            uploader_name=uploader_name
         )
 
-        # uploader = Upload(workspace_name, workspace_key, subscription_key, uploader_name)
         logger.debug(f'{workspace_name=}')
-        logger.debug(f'{workspace_key=}')
-        logger.debug(f'{subscription_key=}')
         logger.debug(f'{uploader_name=}')
-        # uploader.create_workspace_container()
 
-# Create and upload the user name file
-        sanitized_user_name = sanitize_filename(uploader_name)
-        user_file_path = f"{sanitized_user_name}.txt"
-        with open(user_file_path, "w") as f:
-            # Write the uploader information and upload timestamp
-            upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"Uploaded by: {uploader_name}\n")
-            f.write(f"Uploaded on: {upload_time}\n\n")
-            f.write("List of all the uploaded files:\n")
-        #     Write all filenames to the txt file first
-        # uploaded_files = []
-        # with tempfile.TemporaryDirectory() as temp_dir:
-        #     for file in files:
-        #                        f.write(f"{file.filename}\n")
-        #         logger.debug(file.filename)
-
-
-        # # Upload user name file first
-        # # file_label.config(text=f"Uploading: {user_file_path}")
-        # logger.debug(f'{user_file_path=}')
-        # # uploader.file2(user_file_path)
-
-        # Upload selected files
-        # for i, file in enumerate(files, start=2):
-        for file in files:
-            logger.log(f'{file=}')
-            uploader.file2(file)
-
-        uploader.commit_workspace_container()
-
-
-        # # logger.debug("Creating workspace container")
-        # # try:
-        # #     uploader.create_workspace_container()
-        # # except Exception as e:
-        # #     logger.error(f"Container creation failed: {str(e)}")
-        # #     raise HTTPException(
-        # #         status_code=401,
-        # #         detail=f"Authentication failed: {str(e)}"
-        # #     )
-
-        # # uploaded_files = []
-        # # for file in files:
-        # #     logger.debug(f"Processing file: {file.filename}")
-        # #     temp_path = f"/tmp/{file.filename}"
-        # #     try:
-        # #         with open(temp_path, "wb") as buffer:
-        # #             content = await file.read()
-        # #             buffer.write(content)
-                
-        # #         logger.debug(f"Uploading file: {file.filename}")
-        # #         uploader.file2(temp_path)
-        # #         uploaded_files.append(file.filename)
-        # #     except Exception as e:
-        # #         logger.error(f"Error processing file {file.filename}: {str(e)}")
-        # #         raise
-        # #     finally:
-        # #         if os.path.exists(temp_path):
-        # #             os.remove(temp_path)
-        try:
-            temp_path = os.path.join(temp_dir, file.filename)
-            logger.info(f"Processing file: {file.filename}")
-            
-            # Save to temp file
-            content = await file.read()
-            with open(temp_path, "wb") as f:
-                f.write(content)
-            
-            # Upload file
-            logger.info(f"Uploading: {file.filename}")
-            uploader.file2(temp_path)
-            uploaded_files.append(file.filename)
-            logger.info(f"Successfully uploaded: {file.filename}")
-        
-        except Exception as e:
-            logger.error(f"Failed to upload {file.filename}: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=str(e)
-            )
-
-        # logger.debug("Committing workspace container")
-        # uploader.commit_workspace_container()
-        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Copy each upload to the temp dir in chunks so large files are
+            # never held in memory
+            file_paths = []
+            for file in files:
+                temp_path = os.path.join(temp_dir, os.path.basename(file.filename))
+                logger.info(f"Processing file: {file.filename}")
+                await run_in_threadpool(_copy_to_path, file.file, temp_path)
+                file_paths.append(temp_path)
+
+            await run_in_threadpool(uploader.create_workspace_container)
+            try:
+                results = await run_in_threadpool(uploader.upload_files, file_paths)
+                failed = [result for result in results if result["status"] == "error"]
+                if failed:
+                    raise ValueError("; ".join(f"{result['file']}: {result['error']}" for result in failed))
+
+                # The user name file listing every uploaded file
+                await run_in_threadpool(uploader.upload_manifest)
+
+                logger.debug("Committing workspace container")
+                await run_in_threadpool(uploader.commit_workspace_container)
+            finally:
+                uploader.close_container_client()
+
+        uploaded_files = [os.path.basename(path) for path in file_paths]
         return {
             "status": "success",
             "message": f"Successfully uploaded {len(uploaded_files)} files",
@@ -1,149 +1,483 @@
-from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Body
-from typing import List, Dict
+from fastapi import APIRouter, Depends, File, Form, Query, UploadFile, HTTPException, Body, Request, Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Optional
+import hashlib
 import logging
 import os
-from datetime import datetime
+import uuid
 from pathlib import Path
-from app.core.security import decrypt_data
-from pydantic import BaseModel
-from app.utils.uploader import Upload  # Import the uploader
+from app.core.config import settings
+from app.core.memory import memory_budget, reserved_post
+from app.core.security import decrypt_data_async
+from app.services.config_files import read_key_file
+from app.services.fanout import fan_out_upload
+from app.services.resume import resume_store
+from app.services.staging import new_session, staging_area, staging_session
+from app.schemas.upload import Upload2MultiRequest, Upload2Request
+from app.utils.multipart_stream import MultipartError, PART_END, PartStart, iter_multipart
+from app.utils.uploader import Upload, writer_memory  # Import the uploader
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Define upload directory relative to project root
-UPLOAD_DIR = Path("app/uploads")
+UPLOAD_DIR = staging_area.directory
 
 # Ensure upload directory exists
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-def sanitize_filename(name):
-    """Sanitize the user name to create a valid filename."""
-    # Replace invalid characters with underscores
-    return ''.join(c if c.isalnum() or c in (' ', '_') else '_' for c in name)
+
+def staged_file_name(filename):
+    """Return the bare file name for a client-supplied name, or None if unusable."""
+    name = Path(filename.replace('\\', '/')).name
+    if not name or name.startswith('.'):
+        return None
+    return name
+
+
+class StagedFileWriter:
+    """
+    Writes one staged file in fixed-size chunks.
+
+    Data goes to a hidden temporary file (hidden files are not listed) that
+    is renamed into place once the part is complete, so a half-written file
+    is never visible and an aborted request leaves nothing behind. The
+    file is hashed as it is written and then moved into the staging area,
+    which may evict older files to make room for it. Each chunk is counted
+    against the staging quotas before it is written.
+    """
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+        self.path = staging_area.path_for(session, name)
+        self.temp_path = UPLOAD_DIR / f".{name}.{uuid.uuid4().hex}.part"
+        self.size = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = None
+        self._reserved = 0
+        # Bytes written so far, counted against the staging quotas
+        self._staged = 0
+
+    async def open(self):
+        # Room for one chunk in the memory budget, held until the file is done
+        self._reserved = await memory_budget.acquire_async(settings.STAGING_CHUNK_SIZE)
+        try:
+            self._file = await run_in_threadpool(open, self.temp_path, "wb")
+        except Exception:
+            self._release()
+            raise
+
+    def _release(self):
+        memory_budget.release(self._reserved)
+        self._reserved = 0
+
+    async def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        staging_area.check_size(self.size)
+        if len(self._buffer) >= settings.STAGING_CHUNK_SIZE:
+            await self._flush()
+
+    def _write_chunk(self, chunk):
+        staging_area.reserve(self.session, len(chunk))
+        self._staged += len(chunk)
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    async def _flush(self):
+        if self._buffer:
+            await run_in_threadpool(self._write_chunk, bytes(self._buffer))
+            self._buffer.clear()
+
+    async def finish(self):
+        await self._flush()
+        await run_in_threadpool(self._file.close)
+        self._file = None
+        self._release()
+        self.sha256 = self._hash.hexdigest()
+        staged, self._staged = self._staged, 0
+        await run_in_threadpool(
+            staging_area.add, self.session, self.name, self.temp_path, self.size, self.sha256,
+            staged
+        )
+
+    async def discard(self):
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+            self._file = None
+        self._release()
+        staging_area.release(self.session, self._staged)
+        self._staged = 0
+        await run_in_threadpool(self.temp_path.unlink, True)
 
 
-class Upload2Request(BaseModel):
-    workspace_name: str
-    workspace_key: str
-    subscription_key: str
-    uploader_name: str
-    files: List[str]
 
 @router.post("/upload")
-async def upload_files(upload_data: Upload2Request):
+async def upload_files(upload_data: Upload2Request, session: str = Depends(staging_session)):
+    """
+    Upload files staged in the caller's session to a workspace container
+    and commit it.
+
+    Progress is recorded as the upload runs; if it fails, the error detail
+    carries a ``resume_id`` for ``POST /resumable/{resume_id}/resume``.
+    """
+    file_paths = await run_in_threadpool(staging_area.resolve, session, upload_data.files)
+    # Staged files must not be evicted while they are being uploaded
+    with staging_area.pin(file_paths):
+        return await _upload_files(upload_data, file_paths)
+
+async def _upload_files(upload_data: Upload2Request, file_paths: List[Path]):
+    uploader = None
+    resume_state = None
     try:
         logger.info(f"Received upload request for workspace: {upload_data.workspace_name}")
+
+        # Check every file up front so nothing is uploaded for a bad request
+        for file_path in file_paths:
+            if not file_path.exists():
+                logger.error(f"File not found: {file_path}")
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"File not found: {file_path}"
+                )
         
+        resume_state = await run_in_threadpool(
+            resume_store.create, upload_data.workspace_name, upload_data.uploader_name, file_paths,
+            upload_data.compression, upload_data.bundle_small_files
+        )
+        # Not resumable through the API while this request is still running
+        resume_state.active = True
+
         # Initialize uploader with all required parameters
         uploader = Upload(
             workspace_name=upload_data.workspace_name,
             workspace_key=upload_data.workspace_key,
             subscription_key=upload_data.subscription_key,
-            uploader_name=upload_data.uploader_name
+            uploader_name=upload_data.uploader_name,
+            resume_state=resume_state,
+            compression=upload_data.compression,
+            bundle=upload_data.bundle_small_files
         )
-        uploader.create_workspace_container()
+        await run_in_threadpool(uploader.create_workspace_container)
         logger.info(f"Initialized uploader for workspace: {upload_data.workspace_name}")
 
-        # Upload each file
-        # cwd = os.getcwd()
-        # os.chdir(UPLOAD_DIR)
-        upload_log = ''
-        for file_path in upload_data.files:
-            try:
-                file_path = Path(file_path)
-                if file_path.exists():
-                    logger.info(f"Processing file: {file_path}")
-                    
-                    # Get just the filename without the path
-                    file_name = file_path.name
-                    
-                    logger.info(f"Uploading file: {file_name} from path: {file_path}")
-                    logger.info(f'{file_path=}')
-                    try:
-                        # Call file2 with just the file path as string
-                        uploader.file2(str(file_path))
-                        upload_log= upload_log + (f'- {file_name}\n')
-                        logger.info(f"Successfully uploaded: {file_name}")
-                    except Exception as upload_error:
-                        logger.error(f"Error in file2 upload: {str(upload_error)}")
-                        raise HTTPException(
-                            status_code=500, 
-                            detail=f"Error uploading {file_name}: {str(upload_error)}"
-                        )
-                else:
-                    logger.error(f"File not found: {file_path}")
-                    raise HTTPException(
-                        status_code=404, 
-                        detail=f"File not found: {file_path}"
-                    )
-            except Exception as file_error:
-                logger.error(f"Error processing file {file_path}: {str(file_error)}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Error processing file {file_path}: {str(file_error)}"
-                )
-
-            sanitized_user_name = sanitize_filename(upload_data.uploader_name)
-            user_file_path = f"{sanitized_user_name}.txt"
-            with open(user_file_path, "w") as f:
-                # Write the uploader information and upload timestamp
-                upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                f.write(f"Uploaded by: {upload_data.uploader_name}\n")
-                f.write(f"Uploaded on: {upload_time}\n\n")
-                f.write("List of all the uploaded files:\n")
-                f.write(upload_log)
-            uploader.file2(user_file_path)
+        # Upload all files concurrently and wait for every one to finish
+        results = await run_in_threadpool(
+            uploader.upload_files,
+            [str(file_path) for file_path in file_paths],
+            upload_data.max_workers
+        )
+        failed = [result for result in results if result["status"] == "error"]
+        if failed:
+            for result in failed:
+                logger.error(f"Error uploading {result['file']}: {result['error']}")
+            raise HTTPException(
+                status_code=500,
+                detail={
+                    "message": f"{len(failed)} of {len(results)} files failed to upload",
+                    "results": results,
+                    "resume_id": resume_state.id
+                }
+            )
+        logger.info(f"Successfully uploaded {len(results)} files")
 
+        # Write the manifest once, from the entries recorded during the upload
+        await run_in_threadpool(uploader.upload_manifest)
 
         try:
             # Commit the workspace container
-            uploader.commit_workspace_container()
+            await run_in_threadpool(uploader.commit_workspace_container)
             logger.info(f"Successfully committed workspace container for: {upload_data.workspace_name}")
         except Exception as commit_error:
             logger.error(f"Error committing workspace: {str(commit_error)}")
             raise HTTPException(
                 status_code=500, 
-                detail=f"Error committing workspace: {str(commit_error)}"
+                detail={
+                    "message": f"Error committing workspace: {str(commit_error)}",
+                    "resume_id": resume_state.id
+                }
             )
-        # os.chdir(cwd)
         return {
             "status": "success",
-            "message": f"Files uploaded to workspace {upload_data.workspace_name}"
+            "message": f"Files uploaded to workspace {upload_data.workspace_name}",
+            "results": results
         }
 
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
         if isinstance(e, HTTPException):
             raise e
+        if resume_state is not None:
+            raise HTTPException(status_code=500, detail={"message": str(e), "resume_id": resume_state.id})
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Release pooled blob connections if the upload stopped before commit
+        if uploader is not None:
+            uploader.close_container_client()
+        if resume_state is not None:
+            resume_state.active = False
+
+@router.post("/sessions")
+async def create_staging_session():
+    """
+    Start a staging session for one batch of files.
+
+    Send the returned ``session`` in the ``X-Staging-Session`` header to
+    stage, list, delete and upload files in it.
+    """
+    return {"status": "success", "session": new_session()}
+
+@router.post("/files")
+async def stage_files(request: Request, session: str = Depends(staging_session)):
+    """
+    Stage files in the caller's session for a later upload.
+
+    The multipart body is streamed straight to disk in
+    ``MYDRE_STAGING_CHUNK_SIZE`` chunks, so memory use per request stays
+    bounded no matter how large the files are.
+    """
+    staged_files = []
+    writer = None
+    try:
+        async for event in iter_multipart(request):
+            if isinstance(event, PartStart):
+                if not event.is_file:
+                    continue
+                name = staged_file_name(event.filename)
+                if name is None:
+                    raise HTTPException(status_code=400, detail=f"Invalid file name: {event.filename}")
+                writer = StagedFileWriter(session, name)
+                await writer.open()
+            elif event is PART_END:
+                if writer is not None:
+                    await writer.finish()
+                    staged_files.append({
+                        "filename": writer.name,
+                        "path": str(writer.path.absolute()),
+                        "size": writer.size,
+                        "sha256": writer.sha256
+                    })
+                    logger.info(f"File uploaded successfully: {writer.path} ({writer.size} bytes)")
+                    writer = None
+            elif writer is not None:
+                await writer.write(event)
+    except MultipartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if writer is not None:
+            await writer.discard()
+
+    return {
+        "status": "success",
+        "message": f"Uploaded {len(staged_files)} files",
+        "files": staged_files,
+        "bytes_written": sum(file["size"] for file in staged_files)
+    }
+
+DIRECT_UPLOAD_FIELDS = ("workspace_name", "workspace_key", "subscription_key", "uploader_name")
+
+@router.post("/direct")
+async def direct_upload(request: Request):
+    """
+    Upload files straight from the request body into a new workspace container.
+
+    Nothing is written to local disk: each multipart file part is cut into
+    blocks and staged to its blob as it arrives, and the container is
+    committed once the body is complete. The block being filled is
+    reserved from the memory budget along with the writer's. The form fields
+    ``workspace_name``, ``workspace_key``, ``subscription_key`` and
+    ``uploader_name`` must come before the first file.
+    """
+    fields = {}
+    field_name = None
+    field_value = bytearray()
+    uploader = None
+    writer = None
+    block = bytearray()
+    block_reserved = 0
+    uploaded_files = []
+    try:
+        async for event in iter_multipart(request):
+            if isinstance(event, PartStart):
+                if not event.is_file:
+                    field_name = event.name
+                    field_value.clear()
+                    continue
+                name = staged_file_name(event.filename)
+                if name is None:
+                    raise HTTPException(status_code=400, detail=f"Invalid file name: {event.filename}")
+                if uploader is None:
+                    missing = [field for field in DIRECT_UPLOAD_FIELDS if not fields.get(field)]
+                    if missing:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Fields must be sent before the files; missing: {', '.join(missing)}"
+                        )
+                    uploader = Upload(**{field: fields[field] for field in DIRECT_UPLOAD_FIELDS})
+                    # The block buffer below and the blob writer, shared by
+                    # every file (one at a time), in one reservation: a
+                    # second, nested one could wait on other holders forever
+                    block_reserved = await memory_budget.acquire_async(
+                        settings.BLOCK_SIZE + writer_memory(settings.BLOCK_SIZE)
+                    )
+                    await run_in_threadpool(uploader.create_workspace_container)
+                    logger.info(f"Direct upload to workspace: {uploader.workspace_name}")
+                writer = await run_in_threadpool(uploader.open_blob_writer, name, reserve_memory=False)
+            elif event is PART_END:
+                if writer is not None:
+                    if block:
+                        await run_in_threadpool(writer.write, bytes(block))
+                        block.clear()
+                    await run_in_threadpool(writer.close)
+                    uploaded_files.append({
+                        "filename": writer.blob_client.blob_name,
+                        "size": writer.bytes_written,
+                        "sha256": writer.sha256
+                    })
+                    logger.info(f"Successfully uploaded: {writer.blob_client.blob_name}")
+                    writer = None
+                elif field_name is not None:
+                    fields[field_name] = field_value.decode()
+                    field_name = None
+            elif writer is not None:
+                block += event
+                if len(block) >= writer.block_size:
+                    await run_in_threadpool(writer.write, bytes(block))
+                    block.clear()
+            elif field_name is not None:
+                field_value += event
+                if len(field_value) > 64 * 1024:
+                    raise HTTPException(status_code=400, detail=f"Field {field_name} is too large")
+
+        if uploader is None:
+            raise HTTPException(status_code=400, detail="No files were sent")
+        if writer is not None:
+            # The body ended inside a file: never commit a partial upload
+            raise HTTPException(
+                status_code=400,
+                detail=f"Request ended before {writer.blob_client.blob_name} was complete"
+            )
+
+        await run_in_threadpool(uploader.upload_manifest)
+        await run_in_threadpool(uploader.commit_workspace_container)
+        logger.info(f"Successfully committed workspace container for: {uploader.workspace_name}")
+    except MultipartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Direct upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if writer is not None:
+            await run_in_threadpool(writer.abort)
+        memory_budget.release(block_reserved)
+        if uploader is not None:
+            uploader.close_container_client()
+
+    return {
+        "status": "success",
+        "message": f"Files uploaded to workspace {uploader.workspace_name}",
+        "files": uploaded_files,
+        "bytes_uploaded": sum(file["size"] for file in uploaded_files)
+    }
+
+@router.post("/upload-multi")
+async def upload_files_multi(upload_data: Upload2MultiRequest, session: str = Depends(staging_session)):
+    """
+    Upload the same files to several workspaces in one operation.
+
+    Containers are created concurrently, each staged file is read once and
+    streamed to every workspace, and each container is committed on its
+    own. The response holds a status per workspace, with a ``resume_id``
+    for each workspace that failed.
+    """
+    if not upload_data.workspaces:
+        raise HTTPException(status_code=400, detail="No workspaces selected")
+
+    file_paths = await run_in_threadpool(staging_area.resolve, session, upload_data.files)
+
+    uploaders = []
+    for workspace in upload_data.workspaces:
+        resume_state = await run_in_threadpool(
+            resume_store.create, workspace.workspace_name, workspace.uploader_name, file_paths,
+            upload_data.compression, upload_data.bundle_small_files
+        )
+        resume_state.active = True
+        uploaders.append(Upload(
+            **workspace.model_dump(),
+            resume_state=resume_state,
+            compression=upload_data.compression,
+            bundle=upload_data.bundle_small_files
+        ))
+    logger.info(f"Fan-out upload of {len(file_paths)} files to {len(uploaders)} workspaces")
+    try:
+        with staging_area.pin(file_paths):
+            results = await run_in_threadpool(
+                fan_out_upload, uploaders, [str(file_path) for file_path in file_paths],
+                max_workers=upload_data.max_workers
+            )
+    except Exception as e:
+        logger.error(f"Fan-out upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for uploader in uploaders:
+            uploader.resume_state.active = False
+
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    if succeeded == len(results):
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+    return {
+        "status": status,
+        "message": f"Files uploaded to {succeeded} of {len(results)} workspaces",
+        "results": results
+    }
+
+@router.delete("/files")
+async def delete_files(session: str = Depends(staging_session)):
+    """Delete every file staged in the caller's session, except those being uploaded."""
+    removed = await run_in_threadpool(staging_area.clear, session)
+    logger.info(f"Deleted {removed} staged files")
+    return {"status": "success", "message": f"Deleted {removed} files"}
 
 @router.delete("/files/{filename}")
-async def delete_file(filename: str):
+async def delete_file(filename: str, session: str = Depends(staging_session)):
     try:
-        file_path = UPLOAD_DIR / filename
-        if file_path.exists():
-            os.remove(file_path)
-            logger.info(f"File deleted successfully: {file_path}")
+        if await run_in_threadpool(staging_area.remove, session, filename):
+            logger.info(f"File deleted successfully: {staging_area.path_for(session, filename)}")
             return {"status": "success", "message": "File deleted"}
         else:
             raise HTTPException(status_code=404, detail="File not found")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Delete failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/decrypt")
+@reserved_post(router, "/decrypt")
 async def decrypt_mydre_file(
     file: UploadFile = File(...),
     pin: str = Form(...)
 ):
     try:
         # Read the encrypted file content
-        content = await file.read()
+        content = await read_key_file(file)
         
         try:
-            # Use the security.py decrypt_data function
-            decrypted_data = decrypt_data(content, pin)
+            # Use the security.py decrypt_data_async function
+            decrypted_data = await decrypt_data_async(content, pin)
             
             return {
                 "status": "success",
@@ -156,43 +490,40 @@ async def decrypt_mydre_file(
                 "message": "Invalid PIN or corrupted file"
             }
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Decryption process failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/files")
-async def get_uploaded_files():
-    """Get list of files in the upload directory"""
+async def get_uploaded_files(
+    request: Request,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    search: Optional[str] = None,
+    session: str = Depends(staging_session)
+):
+    """
+    List the files staged in the caller's session in name order, a page at
+    a time.
+
+    Served from the staging index rather than the disk. The ``ETag``
+    changes whenever a file is staged or deleted; sending it back in
+    ``If-None-Match`` returns 304 while the listing is unchanged. Pass
+    ``next_offset`` as ``offset`` for the next page.
+    """
     try:
-        logger.info(f"Accessing upload directory at: {UPLOAD_DIR}")
-        
-        # Ensure upload directory exists
-        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        
-        if not UPLOAD_DIR.exists():
-            logger.error(f"Upload directory does not exist: {UPLOAD_DIR}")
-            raise HTTPException(status_code=500, detail="Upload directory not found")
-        
-        files = []
-        try:
-            # List all files in the upload directory
-            for file_path in UPLOAD_DIR.glob('*'):
-                if file_path.is_file() and not file_path.name.startswith('.'):
-                    files.append({
-                        "filename": file_path.name,
-                        "path": str(file_path.absolute())
-                    })
-            
-            logger.info(f"Found {len(files)} files in upload directory")
-            return {
-                "status": "success",
-                "files": files
-            }
-            
-        except Exception as e:
-            logger.error(f"Error listing files: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error listing files: {str(e)}")
-            
+        etag = staging_area.etag(session)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        page = await run_in_threadpool(staging_area.page, session, offset, limit, search)
     except Exception as e:
         logger.error(f"Failed to get uploaded files: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+    response.headers["ETag"] = page.pop("etag")
+    # Let browsers cache the listing but revalidate it on every request
+    response.headers["Cache-Control"] = "no-cache"
+    return {"status": "success", **page}
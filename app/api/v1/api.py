@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import config, combine, upload, upload2
+from app.api.endpoints import config, combine, upload, upload2, jobs, resumable, audit, history, metrics
 
 api_router = APIRouter()
 
@@ -29,4 +29,39 @@ api_router.include_router(
     upload2.router,
     prefix="/upload2",
     tags=["upload2"]
-) 
\ No newline at end of file
+)
+
+# Background job endpoints
+api_router.include_router(
+    jobs.router,
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+# Resumable upload endpoints
+api_router.include_router(
+    resumable.router,
+    prefix="/resumable",
+    tags=["resumable"]
+)
+
+# Upload audit log endpoints
+api_router.include_router(
+    audit.router,
+    prefix="/audit",
+    tags=["audit"]
+)
+
+# Upload history endpoints
+api_router.include_router(
+    history.router,
+    prefix="/history",
+    tags=["history"]
+)
+
+# Metrics endpoints
+api_router.include_router(
+    metrics.router,
+    prefix="/metrics",
+    tags=["metrics"]
+)
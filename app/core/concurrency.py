@@ -0,0 +1,241 @@
+"""
+Adaptive limits on requests in flight to Azure Blob Storage and the myDRE API.
+
+No fixed number of parallel requests suits every link: what saturates a
+slow connection leaves a fast one idle, and what is right for one upload
+gets throttled when several users upload at once. Each
+:class:`AdaptiveLimiter` therefore adjusts its limit with AIMD (additive
+increase, multiplicative decrease), the way TCP sizes its window:
+
+* every request takes a slot for as long as it runs, waiting while the
+  limit is reached;
+* after each window of ``limit`` completed requests, the limit grows by
+  one if requests had to wait for slots (more parallelism could help),
+  latency stayed near its baseline and throughput did not drop because
+  of the previous increase (if it did, that increase is undone);
+* the limit is multiplied by ``MYDRE_CONCURRENCY_BACKOFF`` when the
+  server throttles (429 or 503, including responses the Azure SDK
+  retries by itself) or when latency rises past
+  ``MYDRE_CONCURRENCY_LATENCY_TOLERANCE`` times its baseline, at most
+  once per round trip so a burst of throttled requests counts once.
+
+Latency baselines are kept per operation (a block is not compared with a
+commit), as a slowly rising minimum. For requests that send data the
+latency is divided by the bytes sent, so blocks and files of any size
+share one baseline. Limits
+stay within the configured bounds and are reported under
+``concurrency`` in ``GET /api/v1/metrics``.
+"""
+
+from contextlib import contextmanager
+from app.core.config import settings
+import threading
+import time
+
+# Responses that mean the server wants fewer requests
+THROTTLE_STATUSES = {429, 503}
+
+# How fast a latency baseline drifts up towards higher latencies
+_BASELINE_DRIFT = 0.01
+# Throughput below this share of the previous window's counts as a drop
+_THROUGHPUT_DROP = 0.9
+# Shortest time between two decreases, in seconds
+_MIN_COOLDOWN = 0.05
+
+
+def status_code(error):
+    """The HTTP status of an Azure or requests error, or None."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+class AdaptiveLimiter:
+    """A semaphore whose limit follows AIMD between ``minimum`` and ``maximum``."""
+
+    def __init__(self, name, minimum, maximum, initial=None, backoff=0.5,
+                 latency_tolerance=2.0):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.backoff = min(max(backoff, 0.1), 0.9)
+        self.latency_tolerance = max(1.0, latency_tolerance)
+        initial = self.minimum if initial is None else initial
+        self._limit = min(max(initial, self.minimum), self.maximum)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._baselines = {}
+        self._latency = None
+        self._last_decrease = 0.0
+        self._last_step = 0
+        self._throughput = None
+        self._start_window(time.monotonic())
+        self._requests = 0
+        self._throttled = 0
+        self._increases = 0
+        self._decreases = 0
+        self._waits = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def _start_window(self, now):
+        # Caller holds self._condition (or is __init__)
+        self._window_started = now
+        self._window_requests = 0
+        self._window_bytes = 0
+        self._window_inflation = 0.0
+        self._window_saturated = False
+
+    def acquire(self):
+        """Take a slot, waiting while the limit is reached."""
+        with self._condition:
+            if self._in_flight >= self._limit:
+                self._waits += 1
+                self._window_saturated = True
+                while self._in_flight >= self._limit:
+                    self._condition.wait()
+            self._in_flight += 1
+            if self._in_flight >= self._limit:
+                self._window_saturated = True
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def request(self, operation, nbytes=0):
+        """
+        Hold a slot around one request of ``operation`` sending ``nbytes``.
+
+        A throttling error (429/503) lowers the limit; any other error is
+        passed on without counting either way.
+        """
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if status_code(e) in THROTTLE_STATUSES:
+                self.throttled()
+            raise
+        else:
+            self._completed(operation, nbytes, time.monotonic() - started)
+        finally:
+            self.release()
+
+    def observe_response(self, pipeline_response):
+        """Azure ``raw_response_hook``: sees every attempt, retried ones too."""
+        if pipeline_response.http_response.status_code in THROTTLE_STATUSES:
+            self.throttled()
+
+    def throttled(self):
+        """The server asked for fewer requests: back off multiplicatively."""
+        with self._condition:
+            self._throttled += 1
+            self._decrease(time.monotonic())
+
+    def _decrease(self, now):
+        # Caller holds self._condition. One decrease per round trip: requests
+        # in flight when the limit was cut saw the old load
+        if now - self._last_decrease < max(self._latency or 0.0, _MIN_COOLDOWN):
+            return
+        self._last_decrease = now
+        limit = max(self.minimum, int(self._limit * self.backoff))
+        if limit < self._limit:
+            self._limit = limit
+            self._decreases += 1
+        self._last_step = -1
+        self._start_window(now)
+
+    def _increase(self):
+        # Caller holds self._condition
+        if self._limit < self.maximum:
+            self._limit += 1
+            self._increases += 1
+            self._last_step = 1
+            self._condition.notify()
+        else:
+            self._last_step = 0
+
+    def _completed(self, operation, nbytes, latency):
+        # Seconds per byte for requests that send data, seconds otherwise
+        cost = latency / nbytes if nbytes > 0 else latency
+        key = (operation, nbytes > 0)
+        with self._condition:
+            self._requests += 1
+            baseline = self._baselines.get(key)
+            if baseline is None or cost < baseline:
+                baseline = cost
+            else:
+                baseline += (cost - baseline) * _BASELINE_DRIFT
+            self._baselines[key] = baseline
+            self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+            self._window_requests += 1
+            self._window_bytes += nbytes
+            self._window_inflation += cost / baseline if baseline > 0 else 1.0
+            if self._window_requests >= self._limit:
+                self._end_window(time.monotonic())
+
+    def _end_window(self, now):
+        # Caller holds self._condition
+        elapsed = now - self._window_started
+        throughput = self._window_bytes / elapsed if elapsed > 0 else 0.0
+        inflation = self._window_inflation / self._window_requests
+        previous, self._throughput = self._throughput, throughput
+        if inflation > self.latency_tolerance:
+            self._decrease(now)
+            return
+        if (self._last_step > 0 and previous
+                and throughput < previous * _THROUGHPUT_DROP
+                and self._limit > self.minimum):
+            # The last increase made things worse: undo it
+            self._limit -= 1
+            self._decreases += 1
+            self._last_step = -1
+        elif self._window_saturated:
+            self._increase()
+        else:
+            self._last_step = 0
+        self._start_window(now)
+
+    def stats(self) -> dict:
+        """Return the current limit, bounds, requests in flight and counters."""
+        with self._condition:
+            return {
+                "limit": self._limit,
+                "min": self.minimum,
+                "max": self.maximum,
+                "in_flight": self._in_flight,
+                "requests": self._requests,
+                "waits": self._waits,
+                "throttled": self._throttled,
+                "increases": self._increases,
+                "decreases": self._decreases,
+                "latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+                "throughput_bytes_per_second": round(self._throughput or 0.0)
+            }
+
+
+# Blob requests: stage_block, commit_block_list and upload_blob
+blob_limiter = AdaptiveLimiter(
+    "blob",
+    settings.BLOB_CONCURRENCY_MIN,
+    settings.BLOB_CONCURRENCY_MAX,
+    settings.BLOB_CONCURRENCY_INITIAL,
+    settings.CONCURRENCY_BACKOFF,
+    settings.CONCURRENCY_LATENCY_TOLERANCE
+)
+
+# myDRE management API requests: container create and commit
+api_limiter = AdaptiveLimiter(
+    "api",
+    settings.API_CONCURRENCY_MIN,
+    settings.API_CONCURRENCY_MAX,
+    settings.API_CONCURRENCY_INITIAL,
+    settings.CONCURRENCY_BACKOFF,
+    settings.CONCURRENCY_LATENCY_TOLERANCE
+)
@@ -0,0 +1,122 @@
+"""
+Runtime settings for the myDRE Upload Manager.
+
+Every setting can be overridden with an environment variable of the same
+name prefixed with ``MYDRE_`` (e.g. ``MYDRE_KDF_WORKERS=8``).
+"""
+
+import os
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(f"MYDRE_{name}", default)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(f"MYDRE_{name}")
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(f"MYDRE_{name}")
+    return float(value) if value not in (None, "") else default
+
+
+class Settings:
+    # Key derivation worker pool ("thread" or "process")
+    KDF_EXECUTOR: str = _env_str("KDF_EXECUTOR", "thread")
+    KDF_WORKERS: int = _env_int("KDF_WORKERS", min(4, os.cpu_count() or 1))
+
+    # Cache of PIN-derived keys (size 0 disables it)
+    KEY_CACHE_SIZE: int = _env_int("KEY_CACHE_SIZE", 256)
+    KEY_CACHE_TTL: int = _env_int("KEY_CACHE_TTL", 300)
+
+    # .mydre format written by the server (2 = header with per-file salt, 1 = legacy)
+    FILE_FORMAT_VERSION: int = _env_int("FILE_FORMAT_VERSION", 2)
+    # PBKDF2 iterations for new v2 files, and the most a file may ask for
+    KDF_ITERATIONS: int = _env_int("KDF_ITERATIONS", 100000)
+    KDF_MAX_ITERATIONS: int = _env_int("KDF_MAX_ITERATIONS", 2000000)
+
+    # Maximum number of files per /config/decrypt-batch request
+    DECRYPT_BATCH_MAX_FILES: int = _env_int("DECRYPT_BATCH_MAX_FILES", 100)
+    # Maximum number of files per /combine/merge request
+    COMBINE_MAX_FILES: int = _env_int("COMBINE_MAX_FILES", 100)
+
+    # Shared keep-alive connection pool for the myDRE management API
+    HTTP_POOL_CONNECTIONS: int = _env_int("HTTP_POOL_CONNECTIONS", 4)
+    HTTP_POOL_SIZE: int = _env_int("HTTP_POOL_SIZE", 20)
+    HTTP_CONNECT_TIMEOUT: int = _env_int("HTTP_CONNECT_TIMEOUT", 10)
+    HTTP_READ_TIMEOUT: int = _env_int("HTTP_READ_TIMEOUT", 60)
+
+    # Files larger than the threshold are uploaded as blocks staged in parallel
+    LARGE_FILE_THRESHOLD: int = _env_int("LARGE_FILE_THRESHOLD", 64 * 1024 * 1024)
+    BLOCK_SIZE: int = _env_int("BLOCK_SIZE", 8 * 1024 * 1024)
+    BLOCK_CONCURRENCY: int = _env_int("BLOCK_CONCURRENCY", 4)
+
+    # Adaptive limits on requests in flight (bounds and starting point) to
+    # blob storage and to the management API, the factor a limit is cut by
+    # when throttled, and the latency rise (x baseline) treated as congestion
+    BLOB_CONCURRENCY_MIN: int = _env_int("BLOB_CONCURRENCY_MIN", 2)
+    BLOB_CONCURRENCY_MAX: int = _env_int("BLOB_CONCURRENCY_MAX", 32)
+    BLOB_CONCURRENCY_INITIAL: int = _env_int("BLOB_CONCURRENCY_INITIAL", 8)
+    API_CONCURRENCY_MIN: int = _env_int("API_CONCURRENCY_MIN", 1)
+    API_CONCURRENCY_MAX: int = _env_int("API_CONCURRENCY_MAX", 8)
+    API_CONCURRENCY_INITIAL: int = _env_int("API_CONCURRENCY_INITIAL", 4)
+    CONCURRENCY_BACKOFF: float = _env_float("CONCURRENCY_BACKOFF", 0.5)
+    CONCURRENCY_LATENCY_TOLERANCE: float = _env_float("CONCURRENCY_LATENCY_TOLERANCE", 2.0)
+
+    # Number of files uploaded to a workspace container at the same time; as
+    # many as there can be blob requests, the blob limiter decides how many run
+    UPLOAD_WORKERS: int = _env_int("UPLOAD_WORKERS", BLOB_CONCURRENCY_MAX)
+
+    # Background upload jobs: concurrent jobs, seconds finished jobs are kept, record cap
+    JOB_WORKERS: int = _env_int("JOB_WORKERS", 2)
+    JOB_RETENTION: int = _env_int("JOB_RETENTION", 3600)
+    JOB_MAX_RECORDS: int = _env_int("JOB_MAX_RECORDS", 1000)
+    # Minimum milliseconds between live progress events sent to a subscriber
+    PROGRESS_INTERVAL_MS: int = _env_int("PROGRESS_INTERVAL_MS", 250)
+
+    # Small-file bundling: files under this many bytes are packed into tar
+    # archives of at most this many bytes and files
+    BUNDLE_THRESHOLD: int = _env_int("BUNDLE_THRESHOLD", 1024 * 1024)
+    BUNDLE_MAX_BYTES: int = _env_int("BUNDLE_MAX_BYTES", 256 * 1024 * 1024)
+    BUNDLE_MAX_FILES: int = _env_int("BUNDLE_MAX_FILES", 10000)
+
+    # Also write the upload manifest as '<uploader>.json' (1) next to the text one
+    MANIFEST_JSON: int = _env_int("MANIFEST_JSON", 0)
+
+    # Resumable upload state: directory, and seconds abandoned state is kept
+    RESUME_STATE_DIR: str = _env_str("RESUME_STATE_DIR", "app/upload_state")
+    RESUME_RETENTION: int = _env_int("RESUME_RETENTION", 7 * 24 * 3600)
+
+    # Upload audit log (JSON lines): file, rotation size/age, old files kept,
+    # and records queued for the writer before new ones are dropped
+    AUDIT_LOG_PATH: str = _env_str("AUDIT_LOG_PATH", "app/logs/upload_audit.jsonl")
+    AUDIT_LOG_MAX_BYTES: int = _env_int("AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024)
+    AUDIT_LOG_ROTATE_SECONDS: int = _env_int("AUDIT_LOG_ROTATE_SECONDS", 24 * 3600)
+    AUDIT_LOG_BACKUPS: int = _env_int("AUDIT_LOG_BACKUPS", 5)
+    AUDIT_LOG_QUEUE_SIZE: int = _env_int("AUDIT_LOG_QUEUE_SIZE", 10000)
+
+    # Upload history database, and rows queued for it before new ones are dropped
+    HISTORY_DB_PATH: str = _env_str("HISTORY_DB_PATH", "app/data/history.sqlite3")
+    HISTORY_QUEUE_SIZE: int = _env_int("HISTORY_QUEUE_SIZE", 10000)
+
+    # Bytes all requests together may buffer in memory, seconds to wait for
+    # room before answering 503, and the Retry-After sent with it
+    MEMORY_BUDGET: int = _env_int("MEMORY_BUDGET", 512 * 1024 * 1024)
+    MEMORY_BUDGET_TIMEOUT: int = _env_int("MEMORY_BUDGET_TIMEOUT", 30)
+    MEMORY_BUDGET_RETRY_AFTER: int = _env_int("MEMORY_BUDGET_RETRY_AFTER", 5)
+
+    # Staging area: directory, most bytes it and each session may hold, and
+    # seconds an unused staged file is kept before it is evicted
+    STAGING_DIR: str = _env_str("STAGING_DIR", "app/uploads")
+    STAGING_QUOTA: int = _env_int("STAGING_QUOTA", 10 * 1024 * 1024 * 1024)
+    STAGING_SESSION_QUOTA: int = _env_int("STAGING_SESSION_QUOTA", 2 * 1024 * 1024 * 1024)
+    STAGING_MAX_AGE: int = _env_int("STAGING_MAX_AGE", 7 * 24 * 3600)
+    # Staged files are written to disk in chunks of this size
+    STAGING_CHUNK_SIZE: int = _env_int("STAGING_CHUNK_SIZE", 1024 * 1024)
+    # Largest accepted .mydre key file
+    MAX_KEY_FILE_SIZE: int = _env_int("MAX_KEY_FILE_SIZE", 1024 * 1024)
+
+
+settings = Settings()
@@ -0,0 +1,262 @@
+"""
+Process-wide budget for bytes buffered in memory.
+
+Every path that holds file data in memory (staging, decrypting, uploading)
+reserves the bytes it is about to buffer from :data:`memory_budget` first
+and returns them when done. Reservations are granted in arrival order;
+when the budget is used up callers wait, and if nothing frees up within
+``MYDRE_MEMORY_BUDGET_TIMEOUT`` seconds they get :class:`BudgetExceeded`,
+which FastAPI turns into a 503 with a ``Retry-After`` header. A burst of
+large uploads therefore queues or is turned away instead of exhausting
+the process's memory.
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.routing import APIRoute
+from app.core.config import settings
+import asyncio
+import threading
+
+
+class BudgetExceeded(HTTPException):
+    """No memory budget became available in time."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail="Server is busy: memory budget exhausted, retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class _Waiter:
+    def __init__(self, nbytes, wake):
+        self.nbytes = nbytes
+        self.wake = wake
+        self.granted = False
+
+
+class MemoryBudget:
+    """
+    A byte-counting semaphore shared by threads and the event loop.
+
+    A reservation larger than the whole budget is capped at the budget, so
+    it still goes through once it has the process to itself.
+    """
+
+    def __init__(self, limit: int, timeout: float, retry_after: int):
+        self.limit = max(1, limit)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._in_use = 0
+        self._peak = 0
+        self._granted = 0
+        self._rejected = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _size(self, nbytes):
+        return max(0, min(int(nbytes), self.limit))
+
+    def _take(self, nbytes):
+        # Caller holds self._lock
+        self._in_use += nbytes
+        self._peak = max(self._peak, self._in_use)
+        self._granted += 1
+
+    def _try_take(self, nbytes):
+        # Caller holds self._lock; later arrivals never overtake waiters
+        if not self._waiters and self._in_use + nbytes <= self.limit:
+            self._take(nbytes)
+            return True
+        return False
+
+    def _grant_waiters(self):
+        # Caller holds self._lock
+        while self._waiters and self._in_use + self._waiters[0].nbytes <= self.limit:
+            waiter = self._waiters.popleft()
+            self._take(waiter.nbytes)
+            waiter.granted = True
+            waiter.wake()
+
+    def _give_up(self, waiter):
+        # Caller holds self._lock. Returns True if the bytes were granted
+        # after all, in which case the caller now owns them
+        if waiter.granted:
+            return True
+        self._waiters.remove(waiter)
+        self._rejected += 1
+        self._grant_waiters()
+        return False
+
+    def acquire(self, nbytes: int, timeout: Optional[float] = None) -> int:
+        """
+        Reserve ``nbytes``, blocking the calling thread while the budget is
+        used up. Returns the number of bytes reserved (pass it to
+        :meth:`release`); raises BudgetExceeded after ``timeout`` seconds.
+        """
+        nbytes = self._size(nbytes)
+        timeout = self.timeout if timeout is None else timeout
+        event = threading.Event()
+        with self._lock:
+            if self._try_take(nbytes):
+                return nbytes
+            waiter = _Waiter(nbytes, event.set)
+            self._waiters.append(waiter)
+        event.wait(timeout)
+        with self._lock:
+            if self._give_up(waiter):
+                return nbytes
+        raise BudgetExceeded(self.retry_after)
+
+    async def acquire_async(self, nbytes: int, timeout: Optional[float] = None) -> int:
+        """Like :meth:`acquire`, but waits without blocking the event loop."""
+        nbytes = self._size(nbytes)
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        with self._lock:
+            if self._try_take(nbytes):
+                return nbytes
+            waiter = _Waiter(nbytes, wake)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled while waiting: hand back anything granted meanwhile
+            with self._lock:
+                owned = self._give_up(waiter)
+            if owned:
+                self.release(nbytes)
+            raise
+        with self._lock:
+            if self._give_up(waiter):
+                return nbytes
+        raise BudgetExceeded(self.retry_after)
+
+    def try_acquire(self, nbytes: int) -> int:
+        """Reserve ``nbytes`` only if that needs no wait; return the bytes reserved, or 0."""
+        nbytes = self._size(nbytes)
+        with self._lock:
+            if self._try_take(nbytes):
+                return nbytes
+        return 0
+
+    def release(self, nbytes: int):
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self._in_use = max(0, self._in_use - nbytes)
+            self._grant_waiters()
+
+    @contextmanager
+    def reserve(self, nbytes: int, timeout: Optional[float] = None):
+        reserved = self.acquire(nbytes, timeout)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    @asynccontextmanager
+    async def reserve_async(self, nbytes: int, timeout: Optional[float] = None):
+        reserved = await self.acquire_async(nbytes, timeout)
+        try:
+            yield reserved
+        finally:
+            self.release(reserved)
+
+    def stats(self) -> dict:
+        """Return the budget, bytes in use (and peak), waiters and counters."""
+        with self._lock:
+            return {
+                "limit_bytes": self.limit,
+                "in_use_bytes": self._in_use,
+                "peak_bytes": self._peak,
+                "waiters": len(self._waiters),
+                "waiting_bytes": sum(waiter.nbytes for waiter in self._waiters),
+                "granted": self._granted,
+                "rejected": self._rejected
+            }
+
+
+memory_budget = MemoryBudget(
+    settings.MEMORY_BUDGET,
+    settings.MEMORY_BUDGET_TIMEOUT,
+    settings.MEMORY_BUDGET_RETRY_AFTER
+)
+
+
+# Room for the form fields and part headers around the key files
+_FORM_OVERHEAD = 64 * 1024
+_PART_OVERHEAD = 4 * 1024
+
+
+def _request_body_size(request: Request, limit: int) -> int:
+    """The size of the request body, or ``limit`` if it does not say."""
+    try:
+        size = int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return limit
+    if size > limit:
+        raise HTTPException(
+            status_code=413, detail=f"Request body is larger than the {limit} byte limit"
+        )
+    return size
+
+
+class BodyBudgetRoute(APIRoute):
+    """
+    Route for endpoints that read up to ``max_files`` uploaded key files
+    into memory: holds a reservation the size of the request body while
+    the endpoint runs.
+
+    The reservation is taken in the route handler, before FastAPI reads
+    the body and parses the form, so the bytes are reserved before they
+    are buffered (a dependency would only run after parsing). A body
+    that says it is larger than ``max_files`` key files of
+    ``MYDRE_MAX_KEY_FILE_SIZE`` can hold is refused with a 413 before
+    anything is reserved or read, so one oversized request cannot take
+    the whole budget.
+    """
+
+    max_files = 1
+
+    @classmethod
+    def max_body_size(cls) -> int:
+        return cls.max_files * (settings.MAX_KEY_FILE_SIZE + _PART_OVERHEAD) + _FORM_OVERHEAD
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def reserved_handler(request: Request):
+            size = _request_body_size(request, self.max_body_size())
+            async with memory_budget.reserve_async(size):
+                return await handler(request)
+
+        return reserved_handler
+
+
+def reserved_post(router: APIRouter, path: str, max_files: int = 1, **kwargs):
+    """
+    Like ``@router.post(path)``, for a :class:`BodyBudgetRoute` taking up
+    to ``max_files`` key files.
+    """
+    # A subclass rather than an instance setting, since including the
+    # router in another recreates the route from its class
+    route_class = type(BodyBudgetRoute.__name__, (BodyBudgetRoute,), {"max_files": max(1, max_files)})
+
+    def decorator(endpoint):
+        router.add_api_route(
+            path, endpoint, methods=["POST"], route_class_override=route_class, **kwargs
+        )
+        return endpoint
+    return decorator
@@ -1,29 +1,357 @@
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from app.core.config import settings
+import asyncio
 import base64
+import binascii
+import hashlib
+import hmac
 import logging
+import os
+import struct
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-def derive_key_from_pin(pin: str, salt: bytes = b'myDRE') -> bytes:
+# Parameters of headerless v1 files
+V1_SALT = b'myDRE'
+KDF_ITERATIONS = 100000
+
+# v2 container: MAGIC | version | kdf id | iterations (uint32) | salt length | salt | Fernet token
+MAGIC = b'MYDRE'
+FORMAT_VERSION = 2
+KDF_PBKDF2_SHA256 = 1
+_V2_FIXED_HEADER = struct.Struct('>5sBBIB')
+SALT_SIZE = 16
+MIN_SALT_SIZE = 8
+MIN_KDF_ITERATIONS = 10000
+# Smallest possible Fernet token: version, timestamp, IV, one AES block and HMAC
+_MIN_FERNET_TOKEN_SIZE = 1 + 8 + 16 + 16 + 32
+
+def _check_kdf_settings():
+    # Files written with iterations outside the range parse_header accepts
+    # could never be read back, so refuse to start instead
+    if not MIN_KDF_ITERATIONS <= settings.KDF_ITERATIONS <= settings.KDF_MAX_ITERATIONS:
+        raise ValueError(
+            f"MYDRE_KDF_ITERATIONS must be between {MIN_KDF_ITERATIONS} and "
+            f"MYDRE_KDF_MAX_ITERATIONS ({settings.KDF_MAX_ITERATIONS}), "
+            f"got {settings.KDF_ITERATIONS}"
+        )
+    if settings.KDF_MAX_ITERATIONS > 0xFFFFFFFF:
+        raise ValueError("MYDRE_KDF_MAX_ITERATIONS must fit in 32 bits")
+
+_check_kdf_settings()
+
+def derive_key_from_pin(pin: str, salt: bytes = V1_SALT, iterations: int = KDF_ITERATIONS) -> bytes:
     """Derive an encryption key from the PIN."""
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
-        iterations=100000,
+        iterations=iterations,
     )
     key = base64.urlsafe_b64encode(kdf.derive(pin.encode()))
     return key
 
+
+class KDFPool:
+    """
+    Runs PIN key derivation in a dedicated worker pool.
+
+    PBKDF2 is deliberately slow, so calling it from an ``async def`` handler
+    stalls the event loop for every other request. The pool bounds how many
+    derivations run at once (``workers``); anything above that waits in the
+    executor queue and is reported as ``queued`` by :meth:`stats`.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 4):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown KDF executor type: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="kdf"
+                    )
+            return self._executor
+
+    def submit(self, pin: str, salt: bytes = V1_SALT, iterations: int = KDF_ITERATIONS) -> Future:
+        """Start deriving a key from the PIN and return the future of the key."""
+        executor = self._get_executor()
+        with self._lock:
+            self._in_flight += 1
+        future = executor.submit(derive_key_from_pin, pin, salt, iterations)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    async def derive(self, pin: str, salt: bytes = V1_SALT, iterations: int = KDF_ITERATIONS) -> bytes:
+        """Derive a key from the PIN without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(pin, salt, iterations))
+
+    def stats(self) -> dict:
+        """Return pool size, running/queued derivations and completed count."""
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "running": min(self._in_flight, self.workers),
+                "queued": max(0, self._in_flight - self.workers),
+                "completed": self._completed
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+kdf_pool = KDFPool(settings.KDF_EXECUTOR, settings.KDF_WORKERS)
+
+
+class KeyCache:
+    """
+    Bounded LRU cache of PIN-derived keys with a time-to-live.
+
+    Entries are keyed by an HMAC of (PIN, salt, iterations) under a random
+    per-process secret, so neither the PIN nor a digest that could be
+    brute-forced offline is ever stored. ``max_size=0`` disables caching.
+
+    :meth:`get_or_derive` also keeps the future of every derivation in
+    progress under the same key, so concurrent misses on one key (a burst
+    of files sharing a PIN and salt) wait for one derivation instead of
+    each running their own.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()  # digest -> (expires_at, key)
+        self._pending = {}  # digest -> Future of a derivation in progress
+        # Bumped by flush, so derivations started before it are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _digest(self, pin: str, salt: bytes, iterations: int) -> bytes:
+        message = b"\0".join([pin.encode(), salt, str(iterations).encode()])
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def _lookup(self, digest):
+        # Caller holds self._lock
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, key = entry
+        if expires_at <= time.monotonic():
+            del self._entries[digest]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return key
+
+    def _store(self, digest, key):
+        # Caller holds self._lock
+        self._entries[digest] = (time.monotonic() + self.ttl, key)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, pin: str, salt: bytes, iterations: int):
+        """Return the cached key, or None on a miss or expired entry."""
+        if self.max_size <= 0:
+            return None
+        digest = self._digest(pin, salt, iterations)
+        with self._lock:
+            return self._lookup(digest)
+
+    def put(self, pin: str, salt: bytes, iterations: int, key: bytes):
+        if self.max_size <= 0:
+            return
+        digest = self._digest(pin, salt, iterations)
+        with self._lock:
+            self._store(digest, key)
+
+    def get_or_derive(self, pin: str, salt: bytes, iterations: int, submit):
+        """
+        Return the cached key, or else a future of it: the derivation in
+        progress for the same key, or a new one started with ``submit()``
+        (which must return a Future of the key) and cached once done.
+        """
+        digest = self._digest(pin, salt, iterations)
+        with self._lock:
+            if self.max_size > 0:
+                key = self._lookup(digest)
+                if key is not None:
+                    return key
+            future = self._pending.get(digest)
+            if future is not None:
+                self.shared += 1
+                return future
+            future = submit()
+            self._pending[digest] = future
+            generation = self._generation
+        future.add_done_callback(lambda future: self._derived(digest, generation, future))
+        return future
+
+    def _derived(self, digest, generation, future):
+        with self._lock:
+            if self._pending.get(digest) is future:
+                del self._pending[digest]
+            if (self.max_size > 0 and generation == self._generation
+                    and not future.cancelled() and future.exception() is None):
+                self._store(digest, future.result())
+
+    def flush(self) -> int:
+        """Drop every cached key and return how many were removed."""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._generation += 1
+            return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "deriving": len(self._pending),
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+key_cache = KeyCache(settings.KEY_CACHE_SIZE, settings.KEY_CACHE_TTL)
+
+
+@dataclass
+class MydreHeader:
+    """Key derivation parameters of a .mydre file, readable without the PIN."""
+    version: int
+    kdf: int
+    iterations: int
+    salt: bytes
+    size: int  # Number of header bytes before the Fernet token
+
+
+def parse_header(data: bytes) -> MydreHeader:
+    """
+    Parse and validate the header of a .mydre file.
+
+    Headerless v1 files (a bare Fernet token) are reported as version 1 with
+    the fixed legacy salt. Raises ValueError for anything that is not a
+    well-formed file, so bad input is rejected before paying for a key
+    derivation.
+    """
+    if data.startswith(MAGIC):
+        if len(data) < _V2_FIXED_HEADER.size:
+            raise ValueError("Invalid .mydre file: truncated header")
+        _, version, kdf, iterations, salt_size = _V2_FIXED_HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Invalid .mydre file: unsupported version {version}")
+        if kdf != KDF_PBKDF2_SHA256:
+            raise ValueError(f"Invalid .mydre file: unsupported KDF {kdf}")
+        if not MIN_KDF_ITERATIONS <= iterations <= settings.KDF_MAX_ITERATIONS:
+            raise ValueError(f"Invalid .mydre file: KDF iterations {iterations} out of range")
+        if salt_size < MIN_SALT_SIZE:
+            raise ValueError("Invalid .mydre file: salt too short")
+        size = _V2_FIXED_HEADER.size + salt_size
+        token = data[size:]
+        header = MydreHeader(version, kdf, iterations, data[_V2_FIXED_HEADER.size:size], size)
+    else:
+        token = data.strip()
+        header = MydreHeader(1, KDF_PBKDF2_SHA256, KDF_ITERATIONS, V1_SALT, 0)
+
+    try:
+        raw_token = base64.urlsafe_b64decode(token)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid .mydre file: payload is not a Fernet token")
+    if len(raw_token) < _MIN_FERNET_TOKEN_SIZE or raw_token[0] != 0x80:
+        raise ValueError("Invalid .mydre file: payload is not a Fernet token")
+    return header
+
+def _build_header(salt: bytes, iterations: int) -> bytes:
+    return _V2_FIXED_HEADER.pack(
+        MAGIC, FORMAT_VERSION, KDF_PBKDF2_SHA256, iterations, len(salt)
+    ) + salt
+
+def get_key(pin: str, salt: bytes = V1_SALT, iterations: int = KDF_ITERATIONS) -> bytes:
+    """Return the PIN-derived key, using the key cache when possible."""
+    key = key_cache.get_or_derive(pin, salt, iterations, lambda: kdf_pool.submit(pin, salt, iterations))
+    return key.result() if isinstance(key, Future) else key
+
+async def get_key_async(pin: str, salt: bytes = V1_SALT, iterations: int = KDF_ITERATIONS) -> bytes:
+    """Return the PIN-derived key, deriving it in the KDF pool on a cache miss."""
+    key = key_cache.get_or_derive(pin, salt, iterations, lambda: kdf_pool.submit(pin, salt, iterations))
+    if isinstance(key, Future):
+        # Shielded: a cancelled request must not cancel the derivation others wait for
+        key = await asyncio.shield(asyncio.wrap_future(key))
+    return key
+
+def _encrypt_with_key(data: str, key: bytes) -> bytes:
+    f = Fernet(key)
+    return f.encrypt(data.encode())
+
+def _decrypt_with_key(encrypted_data: bytes, key: bytes) -> str:
+    f = Fernet(key)
+    logger.debug("Fernet instance created")
+
+    decrypted_data = f.decrypt(encrypted_data)
+    logger.debug("Data decrypted successfully")
+
+    return decrypted_data.decode()
+
+def _new_file_params():
+    """Return the (salt, iterations) used for newly written files."""
+    if settings.FILE_FORMAT_VERSION == 1:
+        return V1_SALT, KDF_ITERATIONS
+    return os.urandom(SALT_SIZE), settings.KDF_ITERATIONS
+
+def _wrap(token: bytes, salt: bytes, iterations: int) -> bytes:
+    if settings.FILE_FORMAT_VERSION == 1:
+        return token
+    return _build_header(salt, iterations) + token
+
 def encrypt_data(data: str, pin: str) -> bytes:
     """Encrypt data using PIN-derived key."""
     try:
-        key = derive_key_from_pin(pin)
-        f = Fernet(key)
-        encrypted_data = f.encrypt(data.encode())
-        return encrypted_data
+        salt, iterations = _new_file_params()
+        key = get_key(pin, salt, iterations)
+        return _wrap(_encrypt_with_key(data, key), salt, iterations)
     except Exception as e:
         logger.error(f"Encryption error: {str(e)}")
         raise
@@ -32,16 +360,32 @@ def decrypt_data(encrypted_data: bytes, pin: str) -> str:
     """Decrypt data using PIN-derived key."""
     try:
         logger.debug(f"Starting decryption with PIN length: {len(pin)}")
-        key = derive_key_from_pin(pin)
+        header = parse_header(encrypted_data)
+        key = get_key(pin, header.salt, header.iterations)
+        logger.debug("Key derived successfully")
+        return _decrypt_with_key(encrypted_data[header.size:], key)
+    except Exception as e:
+        logger.error(f"Decryption error: {str(e)}")
+        raise ValueError(f"Failed to decrypt data: {str(e)}")
+
+async def encrypt_data_async(data: str, pin: str) -> bytes:
+    """Encrypt data using PIN-derived key, deriving the key in the KDF pool."""
+    try:
+        salt, iterations = _new_file_params()
+        key = await get_key_async(pin, salt, iterations)
+        return _wrap(_encrypt_with_key(data, key), salt, iterations)
+    except Exception as e:
+        logger.error(f"Encryption error: {str(e)}")
+        raise
+
+async def decrypt_data_async(encrypted_data: bytes, pin: str) -> str:
+    """Decrypt data using PIN-derived key, deriving the key in the KDF pool."""
+    try:
+        logger.debug(f"Starting decryption with PIN length: {len(pin)}")
+        header = parse_header(encrypted_data)
+        key = await get_key_async(pin, header.salt, header.iterations)
         logger.debug("Key derived successfully")
-        
-        f = Fernet(key)
-        logger.debug("Fernet instance created")
-        
-        decrypted_data = f.decrypt(encrypted_data)
-        logger.debug("Data decrypted successfully")
-        
-        return decrypted_data.decode()
+        return _decrypt_with_key(encrypted_data[header.size:], key)
     except Exception as e:
         logger.error(f"Decryption error: {str(e)}")
-        raise ValueError(f"Failed to decrypt data: {str(e)}") 
\ No newline at end of file
+        raise ValueError(f"Failed to decrypt data: {str(e)}")
@@ -25,6 +25,20 @@ templates = Jinja2Templates(directory=Path(__file__).parent / "templates")
 from app.api.v1.api import api_router
 app.include_router(api_router, prefix="/api/v1")
 
+from app.core.security import kdf_pool
+from app.services.history import history_store
+from app.services.jobs import job_manager
+from app.utils.audit_log import audit_log
+from app.utils.uploader import close_session
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    job_manager.shutdown()
+    kdf_pool.shutdown()
+    close_session()
+    audit_log.close()
+    history_store.close()
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     return templates.TemplateResponse(
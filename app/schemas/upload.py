@@ -0,0 +1,44 @@
+from pydantic import BaseModel, field_validator
+from typing import List, Optional
+from app.utils.compression import check_mode
+
+class Upload2Request(BaseModel):
+    workspace_name: str
+    workspace_key: str
+    subscription_key: str
+    uploader_name: str
+    files: List[str]
+    max_workers: Optional[int] = None
+    # "gzip" or "zstd" to compress compressible files on the fly
+    compression: Optional[str] = None
+    # Pack small files into tar archives
+    bundle_small_files: bool = False
+
+    @field_validator("compression")
+    @classmethod
+    def _check_compression(cls, value):
+        check_mode(value)
+        return value
+
+class WorkspaceCredentials(BaseModel):
+    workspace_name: str
+    workspace_key: str
+    subscription_key: str
+    uploader_name: str
+
+class Upload2MultiRequest(BaseModel):
+    workspaces: List[WorkspaceCredentials]
+    files: List[str]
+    max_workers: Optional[int] = None
+    compression: Optional[str] = None
+    bundle_small_files: bool = False
+
+    @field_validator("compression")
+    @classmethod
+    def _check_compression(cls, value):
+        check_mode(value)
+        return value
+
+class ResumeRequest(BaseModel):
+    workspace_key: str
+    subscription_key: str
@@ -0,0 +1,110 @@
+"""
+Helpers for working with decrypted myDRE configuration files.
+"""
+
+from typing import Dict, List, Optional
+from fastapi import HTTPException, UploadFile
+from app.core.config import settings
+from app.core.security import decrypt_data_async
+import json
+
+CONFLICT_POLICIES = ("error", "first", "last")
+
+
+class WorkspaceConflictError(ValueError):
+    """Raised when the same workspace name appears with different settings."""
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        super().__init__(f"Conflicting workspace definitions: {', '.join(names)}")
+
+
+def normalize_config(config: dict) -> dict:
+    """Return the config in the multi-workspace ``{"workspaces": {...}}`` format."""
+    if 'workspaces' in config:
+        return config
+    workspace_name = config.get('workspace_name', 'Workspace')
+    return {
+        "workspaces": {
+            workspace_name: {
+                "workspace_key": config['workspace_key'],
+                "subscription_key": config['subscription_key'],
+                "uploader_name": config['uploader_name']
+            }
+        }
+    }
+
+
+async def read_key_file(file: UploadFile) -> bytes:
+    """
+    Read an uploaded .mydre file in chunks, refusing anything larger than
+    ``MYDRE_MAX_KEY_FILE_SIZE`` with a 413 instead of buffering it.
+    """
+    limit = settings.MAX_KEY_FILE_SIZE
+    content = bytearray()
+    while True:
+        chunk = await file.read(64 * 1024)
+        if not chunk:
+            break
+        content += chunk
+        if len(content) > limit:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{file.filename} is larger than the {limit} byte limit for key files"
+            )
+    return bytes(content)
+
+
+async def decrypt_config_file(content: bytes, pin: str) -> dict:
+    """
+    Decrypt a .mydre file and return its normalized config.
+
+    Raises ValueError with a user-facing message when the PIN is wrong, the
+    file is corrupted or the decrypted data is not a valid configuration.
+    """
+    decrypted_data = await decrypt_data_async(content, pin)
+    try:
+        config = json.loads(decrypted_data)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON format in decrypted data")
+    try:
+        return normalize_config(config)
+    except KeyError as e:
+        raise ValueError(f"Missing field in configuration: {str(e)}")
+
+
+def merge_workspaces(
+    configs: List[dict],
+    conflict: str = "error",
+    include: Optional[List[str]] = None
+) -> Dict[str, dict]:
+    """
+    Merge the ``workspaces`` of several configs into one dict.
+
+    Identical duplicates are merged silently. When a workspace name appears
+    with different settings, ``conflict`` decides: ``"error"`` raises
+    WorkspaceConflictError, ``"first"`` keeps the earliest definition and
+    ``"last"`` keeps the latest. ``include`` optionally limits the result to
+    the given workspace names.
+    """
+    if conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {conflict}")
+
+    merged = {}
+    conflicts = []
+    for config in configs:
+        for name, workspace in config['workspaces'].items():
+            if include is not None and name not in include:
+                continue
+            if name in merged and merged[name] != workspace:
+                if conflict == "error":
+                    if name not in conflicts:
+                        conflicts.append(name)
+                    continue
+                if conflict == "first":
+                    continue
+            merged[name] = workspace
+
+    if conflicts:
+        raise WorkspaceConflictError(conflicts)
+    return merged
@@ -0,0 +1,291 @@
+"""
+Upload one set of files to several workspaces in a single pass.
+
+Each file is read from disk once and the same chunks are handed to every
+target workspace, so sending a dataset to N workspaces costs one read
+(and one checksum for the manifests) instead of N; with compression the
+file is also compressed once for all targets, and with bundling small
+files are packed into tar archives that are built once and streamed to
+every target. Up to ``MYDRE_UPLOAD_WORKERS`` files (or archives) are in
+progress at once, each sent to all targets. Targets fail independently: a workspace whose container
+cannot be created, written or committed is reported as failed while the
+others carry on. Uploaders created with resume state record their blocks
+and files as they go, and a failed workspace's result carries the
+``resume_id`` to finish it with ``POST /resumable/{resume_id}/resume``.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.core.memory import memory_budget
+from app.utils.bundle import TarBundle, bundle_name, plan_bundles
+from app.utils.compression import StreamCompressor, compression_for
+from app.utils.uploader import Upload, writer_memory
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutTarget:
+    """One destination workspace and its outcome."""
+
+    def __init__(self, uploader: Upload):
+        self.uploader = uploader
+        self.error = None
+        self.files = []
+        self._lock = threading.Lock()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def fail(self, message):
+        with self._lock:
+            if self.error is not None:
+                return
+            self.error = message
+        logger.error(f"Fan-out to {self.uploader.workspace_name} failed: {message}")
+
+    def add_files(self, file_names):
+        with self._lock:
+            self.files.extend(file_names)
+
+    def result(self):
+        result = {
+            "workspace_name": self.uploader.workspace_name,
+            "status": "success" if self.ok else "error",
+            "files": self.files
+        }
+        if not self.ok:
+            result["error"] = self.error
+            if self.uploader.resume_state is not None:
+                result["resume_id"] = self.uploader.resume_state.id
+        return result
+
+
+def _run_on_targets(executor, targets, action):
+    """Run ``action(target)`` for every healthy target concurrently."""
+    live = [target for target in targets if target.ok]
+    futures = [(target, executor.submit(action, target)) for target in live]
+    for target, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            target.fail(str(e))
+
+
+def _open_writers(executor, targets, writers, name, block_size, blob_name=None,
+                  local_file_path=None):
+    """
+    Open a blob writer per healthy target. The caller holds the memory
+    for all of them (see :func:`_writers_memory`), reserved in one go:
+    writers reserving one by one could each wait on the next for memory
+    the others hold. With ``local_file_path`` (a file stored as is), the
+    blocks are recorded in each target's resume state.
+    """
+    def open_writer(target):
+        on_block_staged = None
+        if local_file_path is not None:
+            on_block_staged = target.uploader.block_recorder(name, local_file_path, block_size)
+        # The checksum is computed once by the caller rather than by every writer
+        writers[target] = target.uploader.open_blob_writer(
+            name, block_size, checksum=False, blob_name=blob_name, reserve_memory=False,
+            on_block_staged=on_block_staged
+        )
+
+    _run_on_targets(executor, targets, open_writer)
+
+
+def _record_committed(targets, file_name, local_file_path, **details):
+    """Mark a file committed in the resume state of every healthy target."""
+    for target in targets:
+        if target.ok and target.uploader.resume_state is not None:
+            target.uploader.resume_state.file_committed(file_name, local_file_path, **details)
+
+
+def _writers_memory(targets, block_size):
+    return sum(1 for target in targets if target.ok) * writer_memory(block_size)
+
+
+def _upload_file(executor, targets, local_file_path, block_size):
+    file_name = os.path.basename(local_file_path)
+    size = os.path.getsize(local_file_path)
+    live = [target for target in targets if target.ok]
+    # Every target was created with the same compression setting
+    compression = compression_for(
+        live[0].uploader.compression, local_file_path, live[0].uploader.file_names
+    ) if live else None
+    compressor = StreamCompressor(compression) if compression else None
+    sha256 = hashlib.sha256()
+    started = time.monotonic()
+
+    if size <= block_size:
+        # Small file: one read, one upload_blob per workspace
+        with memory_budget.reserve(2 * size if compressor else size):
+            with open(local_file_path, "rb") as source:
+                data = source.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if compressor:
+                data = compressor.compress(data) + compressor.flush()
+            _run_on_targets(
+                executor, targets,
+                lambda target: target.uploader.upload_data(
+                    file_name, data, sha256=digest, compression=compression, size=size
+                )
+            )
+        _record_committed(
+            live, file_name, local_file_path, sha256=digest, duration=time.monotonic() - started,
+            compression=compression, stored_size=len(data) if compression else None
+        )
+    else:
+        writers = {}
+        blob_name = file_name + compressor.extension if compressor else None
+
+        def write(data):
+            # Each writer stages in its own pool; write() only blocks
+            # when that target already has its maximum blocks in flight
+            _run_on_targets(executor, list(writers), lambda target: writers[target].write(data))
+            if compressor:
+                for target in writers:
+                    target.uploader.report_progress(file_name, compressor.bytes_in)
+
+        reserved = memory_budget.acquire(_writers_memory(targets, block_size))
+        try:
+            _open_writers(
+                executor, targets, writers, file_name, block_size, blob_name,
+                None if compressor else local_file_path
+            )
+            with open(local_file_path, "rb") as source:
+                while True:
+                    chunk = source.read(block_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    write(compressor.compress(chunk) if compressor else chunk)
+            if compressor:
+                write(compressor.flush())
+            _run_on_targets(executor, list(writers), lambda target: writers[target].close())
+        finally:
+            for writer in writers.values():
+                if not writer.closed:
+                    writer.abort()
+            memory_budget.release(reserved)
+        duration = time.monotonic() - started
+        stored_size = next(iter(writers.values())).bytes_written if compressor and writers else None
+        for target in writers:
+            if target.ok:
+                target.uploader.record_upload(
+                    file_name, size, sha256.hexdigest(), duration, compression, stored_size
+                )
+        _record_committed(
+            writers, file_name, local_file_path, sha256=sha256.hexdigest(), duration=duration,
+            compression=compression, stored_size=stored_size
+        )
+
+    for target in live:
+        if target.ok:
+            target.add_files([file_name])
+        else:
+            target.uploader.record_failure(file_name, target.error, size)
+
+
+def _upload_bundle(executor, targets, local_file_paths, block_size):
+    live = [target for target in targets if target.ok]
+    compression = live[0].uploader.compression if live else None
+    name = bundle_name(compression)
+    file_names = [os.path.basename(local_file_path) for local_file_path in local_file_paths]
+    writers = {}
+    added = []
+
+    def write(data):
+        _run_on_targets(executor, list(writers), lambda target: writers[target].write(data))
+
+    reserved = memory_budget.acquire(_writers_memory(targets, block_size))
+    try:
+        _open_writers(executor, targets, writers, name, block_size, name)
+        bundle = TarBundle(write, compression)
+        for local_file_path, file_name in zip(local_file_paths, file_names):
+            details = bundle.add(local_file_path)
+            added.append((file_name, details))
+            for target in writers:
+                target.uploader.report_progress(file_name, details["size"])
+        bundle.close()
+        _run_on_targets(executor, list(writers), lambda target: writers[target].close())
+    finally:
+        for writer in writers.values():
+            if not writer.closed:
+                writer.abort()
+        memory_budget.release(reserved)
+    stored_size = next(iter(writers.values())).bytes_written if writers else None
+    for target in writers:
+        if target.ok:
+            target.uploader.manifest.add_archive(name, compression, stored_size)
+            for file_name, details in added:
+                target.uploader.record_upload(
+                    file_name, details["size"], details["sha256"], details["duration"], archive=name
+                )
+    for local_file_path, (file_name, details) in zip(local_file_paths, added):
+        _record_committed(
+            writers, file_name, local_file_path, sha256=details["sha256"],
+            duration=details["duration"], archive=name, archive_size=stored_size
+        )
+
+    for target in live:
+        if target.ok:
+            target.add_files(file_names)
+        else:
+            for file_name in file_names:
+                target.uploader.record_failure(file_name, target.error)
+
+
+def fan_out_upload(uploaders, local_file_paths, block_size=None, max_workers=None):
+    """
+    Upload ``local_file_paths`` to every workspace in ``uploaders``.
+
+    Containers are created concurrently, then up to ``max_workers`` files
+    at a time are each read once and fed to all targets, then each
+    container gets its manifest (written once) and is committed on its
+    own. Small files are bundled if the uploaders were created with
+    ``bundle``. Returns one result dict per workspace, listing its files
+    in input order.
+    """
+    block_size = block_size or settings.BLOCK_SIZE
+    targets = [FanOutTarget(uploader) for uploader in uploaders]
+    file_names = {os.path.basename(local_file_path) for local_file_path in local_file_paths}
+    for uploader in uploaders:
+        uploader.file_names = file_names
+    if uploaders and uploaders[0].bundle:
+        bundles, singles = plan_bundles(local_file_paths)
+    else:
+        bundles, singles = [], local_file_paths
+    tasks = [(_upload_bundle, bundle) for bundle in bundles] + [(_upload_file, path) for path in singles]
+    file_workers = max(1, min(max_workers or settings.UPLOAD_WORKERS, settings.UPLOAD_WORKERS, len(tasks) or 1))
+    # Every file in progress runs its per-target steps on this pool
+    workers = max(1, len(targets) * file_workers)
+
+    def run(task):
+        upload, item = task
+        if any(target.ok for target in targets):
+            upload(executor, targets, item, block_size)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as executor:
+        try:
+            _run_on_targets(executor, targets, lambda target: target.uploader.create_workspace_container())
+            with ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix="fanout-file") as file_executor:
+                futures = [file_executor.submit(run, task) for task in tasks]
+                for future in futures:
+                    future.result()
+            order = {os.path.basename(local_file_path): index
+                     for index, local_file_path in enumerate(local_file_paths)}
+            for target in targets:
+                target.files.sort(key=lambda file_name: order.get(file_name, len(order)))
+            _run_on_targets(executor, targets, lambda target: target.uploader.upload_manifest())
+            _run_on_targets(executor, targets, lambda target: target.uploader.commit_workspace_container())
+        finally:
+            for target in targets:
+                target.uploader.close_container_client()
+
+    return [target.result() for target in targets]
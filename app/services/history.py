@@ -0,0 +1,303 @@
+"""
+Upload history in an indexed SQLite database.
+
+One row per file upload attempt: time, job, workspace, uploader, file,
+size, SHA-256, duration and outcome. Rows are queued by the uploading
+threads and inserted in batches by a single writer thread, so recording
+never waits on the database. Queries use their own connections (the
+database runs in WAL mode, so reads don't block the writer).
+
+Rows are inserted in time order, so row IDs double as the time axis: a
+time range is turned into an ID range through the ``time`` index, and
+the workspace, uploader and job indexes (which SQLite keeps sorted by
+row ID within each value) then serve both the filter and the newest-first
+order. Pages use a keyset cursor on the row ID, so queries stay fast
+however many rows there are.
+
+Aggregates are served from ``daily_totals``, a per day, workspace,
+uploader and outcome rollup the writer keeps up to date in the same
+transaction as the rows, so they cost the number of days asked for
+rather than the number of uploads.
+"""
+
+from pathlib import Path
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from app.core.config import settings
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SUCCESS = "success"
+ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    job_id TEXT,
+    workspace_name TEXT NOT NULL,
+    uploader_name TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    duration REAL,
+    outcome TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS uploads_workspace ON uploads (workspace_name);
+CREATE INDEX IF NOT EXISTS uploads_uploader ON uploads (uploader_name);
+CREATE INDEX IF NOT EXISTS uploads_job ON uploads (job_id);
+CREATE INDEX IF NOT EXISTS uploads_time ON uploads (time);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    workspace_name TEXT NOT NULL,
+    uploader_name TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    duration_total REAL NOT NULL,
+    duration_count INTEGER NOT NULL,
+    PRIMARY KEY (day, workspace_name, uploader_name, outcome)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_totals_workspace ON daily_totals (workspace_name, day);
+"""
+
+_COLUMNS = (
+    "time", "job_id", "workspace_name", "uploader_name", "file_name",
+    "size", "sha256", "duration", "outcome", "error"
+)
+
+# What /history/aggregate can group by, and the daily_totals column for each
+GROUPS = {
+    "workspace": "workspace_name",
+    "uploader": "uploader_name",
+    "day": "day",
+    "outcome": "outcome",
+}
+
+_STOP = object()
+_BATCH_SIZE = 1000
+
+
+def _daily_totals(batch):
+    """Sum a batch of upload rows into daily_totals rows."""
+    totals = {}
+    for row in batch:
+        upload_time, _, workspace_name, uploader_name, _, size, _, duration, outcome, _ = row
+        day = datetime.fromtimestamp(upload_time, timezone.utc).date().isoformat()
+        total = totals.setdefault((day, workspace_name, uploader_name, outcome), [0, 0, 0.0, 0])
+        total[0] += 1
+        total[1] += size or 0
+        if duration is not None:
+            total[2] += duration
+            total[3] += 1
+    return [key + tuple(total) for key, total in totals.items()]
+
+
+class HistoryStore:
+    """Writer thread and query helpers for the upload history database."""
+
+    def __init__(self, path, queue_size=10000):
+        self.path = Path(path)
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._thread = None
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._written = 0
+        self._dropped = 0
+        self._last_time = 0.0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _initialize(self):
+        with self._lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            try:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(_SCHEMA)
+            finally:
+                connection.close()
+            self._initialized = True
+
+    def record(self, workspace_name, uploader_name, file_name, outcome, size=None,
+               sha256=None, duration=None, error=None, job_id=None):
+        """Queue one upload attempt for the database; never blocks."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history", daemon=True)
+                self._thread.start()
+        row = (time.time(), job_id, workspace_name, uploader_name, file_name,
+               size, sha256, duration, outcome, error)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _run(self):
+        self._initialize()
+        connection = self._connect()
+        try:
+            while True:
+                row = self._queue.get()
+                if row is _STOP:
+                    break
+                batch = [row]
+                stop = False
+                while len(batch) < _BATCH_SIZE:
+                    try:
+                        row = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if row is _STOP:
+                        stop = True
+                        break
+                    batch.append(row)
+                # Keep times in insertion order even if threads raced to the queue
+                for index, row in enumerate(batch):
+                    self._last_time = max(self._last_time, row[0])
+                    batch[index] = (self._last_time,) + row[1:]
+                try:
+                    with connection:
+                        connection.executemany(
+                            f"INSERT INTO uploads ({', '.join(_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                            batch
+                        )
+                        connection.executemany(
+                            "INSERT INTO daily_totals VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT DO UPDATE SET "
+                            "files = files + excluded.files, "
+                            "bytes = bytes + excluded.bytes, "
+                            "duration_total = duration_total + excluded.duration_total, "
+                            "duration_count = duration_count + excluded.duration_count",
+                            _daily_totals(batch)
+                        )
+                    with self._lock:
+                        self._written += len(batch)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not write upload history: {str(e)}")
+                if stop:
+                    break
+        finally:
+            connection.close()
+
+    def _where(self, workspace_name=None, uploader_name=None, job_id=None,
+               outcome=None, since=None, until=None):
+        clauses = []
+        params = []
+        for column, value in (("workspace_name", workspace_name), ("uploader_name", uploader_name),
+                              ("job_id", job_id), ("outcome", outcome)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        # Time bounds become row ID bounds (the first row at or after each time)
+        first_id_from = (
+            "COALESCE((SELECT id FROM uploads INDEXED BY uploads_time WHERE time >= ? ORDER BY time LIMIT 1), "
+            "(SELECT MAX(id) + 1 FROM uploads))"
+        )
+        if since is not None:
+            clauses.append(f"id >= {first_id_from}")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"id < {first_id_from}")
+            params.append(until)
+        return clauses, params
+
+    def query(self, limit=100, before_id=None, **filters) -> dict:
+        """
+        Return up to ``limit`` rows matching ``filters``, newest first.
+
+        Pass the returned ``next_cursor`` as ``before_id`` for the next page.
+        """
+        self._initialize()
+        clauses, params = self._where(**filters)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f"SELECT id, {', '.join(_COLUMNS)} FROM uploads {where} ORDER BY id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+        finally:
+            connection.close()
+        records = [dict(row) for row in rows[:limit]]
+        return {
+            "records": records,
+            "next_cursor": records[-1]["id"] if len(rows) > limit else None
+        }
+
+    def aggregate(self, group_by: List[str], workspace_name=None, uploader_name=None,
+                  outcome=None, start_day: Optional[date] = None,
+                  end_day: Optional[date] = None) -> List[dict]:
+        """
+        Count files and sum uploaded bytes per group, e.g. per workspace per
+        day, over the days from ``start_day`` to ``end_day`` (UTC, inclusive).
+        """
+        self._initialize()
+        clauses = []
+        params = []
+        for column, value in (("workspace_name", workspace_name), ("uploader_name", uploader_name),
+                              ("outcome", outcome)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start_day is not None:
+            clauses.append("day >= ?")
+            params.append(start_day.isoformat())
+        if end_day is not None:
+            clauses.append("day <= ?")
+            params.append(end_day.isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = [f"{GROUPS[group]} AS {group}" for group in group_by] + [
+            "SUM(files) AS files",
+            "SUM(CASE WHEN outcome = 'success' THEN bytes ELSE 0 END) AS bytes",
+            "SUM(CASE WHEN outcome = 'error' THEN files ELSE 0 END) AS errors",
+            "SUM(duration_total) / NULLIF(SUM(duration_count), 0) AS average_duration",
+        ]
+        group_clause = f"GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}" if group_by else ""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f"SELECT {', '.join(columns)} FROM daily_totals {where} {group_clause}", params
+            ).fetchall()
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self._written,
+                "dropped": self._dropped
+            }
+
+    def close(self, timeout=5):
+        """Write out queued rows and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+
+history_store = HistoryStore(settings.HISTORY_DB_PATH, settings.HISTORY_QUEUE_SIZE)
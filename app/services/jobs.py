@@ -0,0 +1,225 @@
+"""
+In-process background jobs for long-running uploads.
+
+Uploads run on a bounded worker pool instead of inside the HTTP request,
+so clients get a job ID straight away and poll for progress. Finished job
+records are kept for ``MYDRE_JOB_RETENTION`` seconds (and at most
+``MYDRE_JOB_MAX_RECORDS`` of them) before they are evicted. Progress updates are also pushed to live
+subscribers through each job's :class:`~app.services.progress.ProgressChannel`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.services.progress import ProgressChannel
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """State, progress and outcome of one background job."""
+
+    def __init__(self, kind, total_bytes=0, session=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        # Staging session that submitted the job; listings only show its own
+        self.session = session
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total_bytes = total_bytes
+        self.cancel_event = threading.Event()
+        self.errors = []
+        self.results = None
+        self.future = None
+        self.progress = ProgressChannel(settings.PROGRESS_INTERVAL_MS / 1000)
+        self._files = {}  # (workspace, file name) -> {"size", "bytes_sent"}
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def add_file(self, workspace, file_name, size):
+        with self._lock:
+            self._files[(workspace, file_name)] = {"size": size, "bytes_sent": 0}
+
+    def update_progress(self, workspace, file_name, bytes_sent):
+        """
+        Record cumulative bytes sent for one file of one workspace.
+
+        A file that was not added up front (a container's manifest, whose
+        size is only known once it is written) is added with the bytes sent
+        as its size, and counted in ``total_bytes``.
+        """
+        with self._lock:
+            entry = self._files.get((workspace, file_name))
+            if entry is None:
+                entry = self._files[(workspace, file_name)] = {"size": bytes_sent, "bytes_sent": 0}
+                self.total_bytes += bytes_sent
+            entry["bytes_sent"] = max(entry["bytes_sent"], bytes_sent)
+        self.progress.notify()
+
+    @property
+    def bytes_transferred(self):
+        with self._lock:
+            return sum(entry["bytes_sent"] for entry in self._files.values())
+
+    def to_dict(self, include_files=True):
+        with self._lock:
+            files = [
+                {
+                    "workspace_name": workspace,
+                    "filename": file_name,
+                    "size": entry["size"],
+                    "bytes_sent": entry["bytes_sent"]
+                }
+                for (workspace, file_name), entry in self._files.items()
+            ]
+        bytes_transferred = sum(file["bytes_sent"] for file in files)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0
+        job = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_bytes": self.total_bytes,
+            "bytes_transferred": bytes_transferred,
+            "throughput_bytes_per_second": bytes_transferred / elapsed if elapsed > 0 else 0,
+            "errors": list(self.errors),
+            "results": self.results
+        }
+        if include_files:
+            job["files"] = files
+        return job
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps their records for polling."""
+
+    def __init__(self, workers=2, retention=3600, max_records=1000):
+        self.workers = max(1, workers)
+        self.retention = retention
+        self.max_records = max_records
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        return self._executor
+
+    def submit(self, job, func):
+        """
+        Queue ``func(job)`` and return the job.
+
+        ``func`` may return a results object; it should watch
+        ``job.cancel_event`` and raise when it is set.
+        """
+        with self._lock:
+            self._evict()
+            self._jobs[job.id] = job
+            job.future = self._get_executor().submit(self._run, job, func)
+        logger.info(f"Queued {job.kind} job {job.id}")
+        return job
+
+    def _run(self, job, func):
+        if job.cancel_event.is_set():
+            job.state = CANCELLED
+            job.finished_at = time.time()
+            job.progress.notify(force=True)
+            return
+        job.state = RUNNING
+        job.started_at = time.time()
+        job.progress.notify(force=True)
+        try:
+            job.results = func(job)
+            if job.cancel_event.is_set():
+                job.state = CANCELLED
+            elif job.errors:
+                job.state = FAILED
+            else:
+                job.state = COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.errors.append(str(e))
+            job.state = CANCELLED if job.cancel_event.is_set() else FAILED
+        finally:
+            job.finished_at = time.time()
+            job.progress.notify(force=True)
+            logger.info(f"Job {job.id} finished: {job.state}")
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def list(self, session=None):
+        """Known jobs, only those submitted from ``session`` if given."""
+        with self._lock:
+            self._evict()
+            return [job for job in self._jobs.values() if session is None or job.session == session]
+
+    def cancel(self, job_id):
+        """Request cancellation; returns the job or None if it is unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.finished:
+            job.cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                job.state = CANCELLED
+                job.finished_at = time.time()
+                job.progress.notify(force=True)
+        return job
+
+    def _evict(self):
+        # Caller holds self._lock
+        now = time.time()
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished),
+            key=lambda job: job.finished_at
+        )
+        excess = len(self._jobs) - self.max_records
+        for job in finished:
+            if now - job.finished_at > self.retention or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {
+                "workers": self.workers,
+                "jobs": len(self._jobs),
+                "states": states
+            }
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            executor, self._executor = self._executor, None
+        for job in jobs:
+            job.cancel_event.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager(settings.JOB_WORKERS, settings.JOB_RETENTION, settings.JOB_MAX_RECORDS)
@@ -0,0 +1,155 @@
+"""
+Live progress notifications for background jobs.
+
+Upload threads report progress through :meth:`ProgressChannel.notify`;
+subscribers (the Server-Sent Events endpoint) are woken at most once per
+``MYDRE_PROGRESS_INTERVAL_MS`` and read a fresh snapshot of the job. With
+no subscribers ``notify`` returns after a single emptiness check, and
+wake-ups never queue up: a slow subscriber only ever sees the latest state.
+"""
+
+from typing import Optional
+import asyncio
+import json
+import threading
+import time
+
+# Rate smoothing factor: weight of the newest sample in the moving average
+RATE_SMOOTHING = 0.3
+
+
+class ProgressSubscription:
+    """Wake-up flag for one subscriber, owned by its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def wake(self):
+        """Thread-safe: flag the subscriber for its next snapshot."""
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is gone
+            pass
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait until woken or ``timeout`` seconds pass; True if woken."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+class ProgressChannel:
+    """Throttled fan-out of progress notifications for one job."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._subscribers = []
+        self._last_notify = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return bool(self._subscribers)
+
+    def subscribe(self) -> ProgressSubscription:
+        """Register a subscriber; call from the subscriber's event loop."""
+        subscription = ProgressSubscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers = self._subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: ProgressSubscription):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+
+    def notify(self, force=False):
+        """Wake subscribers, at most once per interval unless ``force``."""
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_notify < self.interval:
+                return
+            self._last_notify = now
+        for subscription in subscribers:
+            subscription.wake()
+
+
+class _RateTracker:
+    def __init__(self):
+        self.time = None
+        self.bytes = 0
+        self.rate = 0.0
+
+    def update(self, now, bytes_sent):
+        if self.time is not None and now > self.time:
+            sample = max(0, bytes_sent - self.bytes) / (now - self.time)
+            self.rate = sample if self.rate == 0 else RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * self.rate
+        self.time = now
+        self.bytes = bytes_sent
+        return self.rate
+
+
+def _eta(rate: float, total: int, sent: int) -> Optional[float]:
+    remaining = max(0, total - sent)
+    if remaining == 0:
+        return 0.0
+    return round(remaining / rate, 1) if rate > 0 else None
+
+
+class ProgressMeter:
+    """
+    Turns successive job snapshots into progress events.
+
+    Adds the current transfer rate (a moving average between snapshots) and
+    an ETA for the whole job and for each workspace.
+    """
+
+    def __init__(self):
+        self._rates = {}
+
+    def _rate(self, key, now, bytes_sent):
+        tracker = self._rates.setdefault(key, _RateTracker())
+        return tracker.update(now, bytes_sent)
+
+    def event(self, job: dict) -> dict:
+        now = time.monotonic()
+        workspaces = {}
+        for file in job.get("files", []):
+            workspace = workspaces.setdefault(file["workspace_name"], {"bytes_sent": 0, "total_bytes": 0})
+            workspace["bytes_sent"] += file["bytes_sent"]
+            workspace["total_bytes"] += file["size"] or 0
+
+        for name, workspace in workspaces.items():
+            rate = self._rate(name, now, workspace["bytes_sent"])
+            workspace["workspace_name"] = name
+            workspace["rate_bytes_per_second"] = round(rate)
+            workspace["eta_seconds"] = _eta(rate, workspace["total_bytes"], workspace["bytes_sent"])
+
+        rate = self._rate(None, now, job["bytes_transferred"])
+        event = {
+            "job_id": job["job_id"],
+            "state": job["state"],
+            "total_bytes": job["total_bytes"],
+            "bytes_transferred": job["bytes_transferred"],
+            "rate_bytes_per_second": round(rate),
+            "eta_seconds": _eta(rate, job["total_bytes"], job["bytes_transferred"]),
+            "errors": job["errors"],
+            "workspaces": list(workspaces.values()),
+            "files": job.get("files", [])
+        }
+        if job.get("results") is not None:
+            event["results"] = job["results"]
+        return event
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,341 @@
+"""
+Persisted state for resumable uploads.
+
+Each upload to a workspace container records its container location and,
+per file, the blocks staged so far (ID, offset and length) under
+``MYDRE_RESUME_STATE_DIR``: a JSON snapshot, plus a journal of the blocks
+and files recorded since, one JSON line each, so recording a block costs
+one small append rather than rewriting the whole state. The journal is
+folded into a new snapshot every ``_JOURNAL_COMPACT`` records; journal
+lines carry the snapshot's generation, so lines left over from before a
+snapshot are never replayed onto it. When an upload dies part way, a
+retry reuses the open container and stages only the blocks that are
+missing. The state file is removed once the container is committed;
+abandoned state expires after ``MYDRE_RESUME_RETENTION`` seconds, in line
+with the storage service discarding uncommitted blocks after a week.
+
+The container location carries a SAS token, so state files are written
+readable by the owner only and the location is never returned by the API.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.core.config import settings
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Journal records after which the state is written out as a new snapshot
+_JOURNAL_COMPACT = 1000
+
+
+class ResumableUpload:
+    """Progress of one upload to one workspace container."""
+
+    def __init__(self, store, upload_id, workspace_name, uploader_name, files,
+                 container_location="", created_at=None, updated_at=None, compression=None,
+                 bundle=False):
+        self.store = store
+        self.id = upload_id
+        self.workspace_name = workspace_name
+        self.uploader_name = uploader_name
+        self.container_location = container_location
+        self.compression = compression
+        self.bundle = bundle
+        # file name -> {"path", "size", "mtime", "block_size", "blocks", "committed",
+        #               "sha256", "duration", "compression", "stored_size", "archive",
+        #               "archive_size"}
+        self.files = files
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.active = False
+        self.generation = 0
+        self._journaled = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, store, data, journal=()):
+        upload = cls(
+            store, data["id"], data["workspace_name"], data["uploader_name"], data["files"],
+            data.get("container_location", ""), data.get("created_at"), data.get("updated_at"),
+            data.get("compression"), data.get("bundle", False)
+        )
+        upload.generation = data.get("generation", 0)
+        for record in journal:
+            if record.get("generation") == upload.generation:
+                upload._replay(record)
+        return upload
+
+    def _replay(self, record):
+        if record["op"] == "block":
+            entry = self.files.get(record["file"])
+            if entry is not None:
+                entry["blocks"][record["block_id"]] = [record["offset"], record["length"]]
+        elif record["op"] == "file":
+            self.files[record["file"]] = record["entry"]
+        self.updated_at = record.get("time", self.updated_at)
+        self._journaled += 1
+
+    def _state(self):
+        return {
+            "id": self.id,
+            "workspace_name": self.workspace_name,
+            "uploader_name": self.uploader_name,
+            "container_location": self.container_location,
+            "compression": self.compression,
+            "bundle": self.bundle,
+            "files": self.files,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "generation": self.generation
+        }
+
+    def _save(self):
+        # Caller holds self._lock. Writes a full snapshot and starts a new journal
+        self.updated_at = time.time()
+        self.generation += 1
+        self._journaled = 0
+        self.store.save(self.id, self._state())
+
+    def _journal(self, record):
+        # Caller holds self._lock
+        if self._journaled >= _JOURNAL_COMPACT:
+            self._save()
+            return
+        self.updated_at = time.time()
+        self._journaled += 1
+        self.store.append(self.id, {**record, "generation": self.generation, "time": self.updated_at})
+
+    def file_paths(self) -> List[str]:
+        with self._lock:
+            return [entry["path"] for entry in self.files.values()]
+
+    def set_container(self, container_location):
+        with self._lock:
+            self.container_location = container_location
+            for entry in self.files.values():
+                entry["blocks"] = {}
+                entry["committed"] = False
+            self._save()
+
+    def _entry(self, file_name, local_file_path):
+        # Caller holds self._lock. Returns the file's record, reset if the
+        # file on disk changed since it was recorded
+        stat = os.stat(local_file_path)
+        entry = self.files.get(file_name)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            entry = {
+                "path": str(local_file_path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "block_size": None,
+                "blocks": {},
+                "committed": False
+            }
+            self.files[file_name] = entry
+        return entry
+
+    def committed_file(self, file_name, local_file_path) -> Optional[dict]:
+        """
+        Return ``{"sha256", "duration", "compression", "stored_size", "archive",
+        "archive_size"}`` if the file was already committed.
+        """
+        with self._lock:
+            entry = self._entry(file_name, local_file_path)
+            if not entry["committed"]:
+                return None
+            return {
+                key: entry.get(key)
+                for key in ("sha256", "duration", "compression", "stored_size", "archive", "archive_size")
+            }
+
+    def staged_blocks(self, file_name, local_file_path, block_size) -> Dict[str, int]:
+        """
+        Return ``{block ID: length}`` of blocks already staged for the file.
+
+        Recorded blocks are dropped if the file changed or was staged with a
+        different block size.
+        """
+        with self._lock:
+            entry = self._entry(file_name, local_file_path)
+            if entry["block_size"] != block_size:
+                entry["block_size"] = block_size
+                entry["blocks"] = {}
+                self._journal({"op": "file", "file": file_name, "entry": entry})
+            return {block_id: length for block_id, (_, length) in entry["blocks"].items()}
+
+    def block_staged(self, file_name, block_id, offset, length):
+        with self._lock:
+            entry = self.files[file_name]
+            entry["blocks"][block_id] = [offset, length]
+            self._journal({
+                "op": "block", "file": file_name, "block_id": block_id,
+                "offset": offset, "length": length
+            })
+
+    def file_committed(self, file_name, local_file_path, sha256=None, duration=None,
+                       compression=None, stored_size=None, archive=None, archive_size=None):
+        with self._lock:
+            entry = self._entry(file_name, local_file_path)
+            entry["committed"] = True
+            entry["blocks"] = {}
+            entry["sha256"] = sha256
+            entry["duration"] = duration
+            entry["compression"] = compression
+            entry["stored_size"] = stored_size
+            entry["archive"] = archive
+            entry["archive_size"] = archive_size
+            self._journal({"op": "file", "file": file_name, "entry": entry})
+
+    def finish(self):
+        """The container was committed: the upload no longer needs resuming."""
+        self.store.delete(self.id)
+
+    def to_dict(self):
+        with self._lock:
+            files = [
+                {
+                    "filename": file_name,
+                    "size": entry["size"],
+                    "committed": entry["committed"],
+                    "bytes_staged": entry["size"] if entry["committed"]
+                    else sum(length for _, length in entry["blocks"].values())
+                }
+                for file_name, entry in self.files.items()
+            ]
+            return {
+                "resume_id": self.id,
+                "workspace_name": self.workspace_name,
+                "uploader_name": self.uploader_name,
+                "compression": self.compression,
+                "bundle": self.bundle,
+                "container_created": bool(self.container_location),
+                "active": self.active,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+                "files": files
+            }
+
+
+class ResumeStore:
+    """Directory of resumable upload state files, one per upload."""
+
+    def __init__(self, directory, retention):
+        self.directory = Path(directory)
+        self.retention = retention
+        self._uploads = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _path(self, upload_id):
+        return self.directory / f"{upload_id}.json"
+
+    def _journal_path(self, upload_id):
+        return self.directory / f"{upload_id}.journal"
+
+    def _read_journal(self, upload_id):
+        records = []
+        try:
+            with open(self._journal_path(upload_id), encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a crash ends the journal
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _load(self):
+        # Caller holds self._lock
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.directory.is_dir():
+            return
+        for path in self.directory.glob("*.json"):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self._uploads[data["id"]] = ResumableUpload.from_dict(
+                    self, data, self._read_journal(data["id"])
+                )
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable upload state {path.name}: {str(e)}")
+
+    def _evict(self):
+        # Caller holds self._lock
+        now = time.time()
+        for upload in list(self._uploads.values()):
+            if not upload.active and now - upload.updated_at > self.retention:
+                del self._uploads[upload.id]
+                self._path(upload.id).unlink(missing_ok=True)
+                self._journal_path(upload.id).unlink(missing_ok=True)
+
+    def create(self, workspace_name, uploader_name, local_file_paths, compression=None,
+               bundle=False) -> ResumableUpload:
+        files = {}
+        for local_file_path in local_file_paths:
+            stat = os.stat(local_file_path)
+            files[os.path.basename(local_file_path)] = {
+                "path": str(local_file_path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "block_size": None,
+                "blocks": {},
+                "committed": False
+            }
+        upload = ResumableUpload(
+            self, uuid.uuid4().hex, workspace_name, uploader_name, files, compression=compression,
+            bundle=bundle
+        )
+        with self._lock:
+            self._load()
+            self._evict()
+            self._uploads[upload.id] = upload
+        with upload._lock:
+            upload._save()
+        return upload
+
+    def save(self, upload_id, state):
+        """Atomically write the snapshot of an upload and drop its old journal."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(upload_id)
+        temp_path = path.with_suffix(".tmp")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, path)
+        self._journal_path(upload_id).unlink(missing_ok=True)
+
+    def append(self, upload_id, record):
+        """Append one record to the journal of an upload."""
+        fd = os.open(self._journal_path(upload_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as journal:
+            journal.write(json.dumps(record) + "\n")
+
+    def get(self, upload_id) -> Optional[ResumableUpload]:
+        with self._lock:
+            self._load()
+            self._evict()
+            return self._uploads.get(upload_id)
+
+    def list(self) -> List[ResumableUpload]:
+        with self._lock:
+            self._load()
+            self._evict()
+            return sorted(self._uploads.values(), key=lambda upload: upload.created_at)
+
+    def delete(self, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+            self._path(upload_id).unlink(missing_ok=True)
+            self._journal_path(upload_id).unlink(missing_ok=True)
+
+
+resume_store = ResumeStore(settings.RESUME_STATE_DIR, settings.RESUME_RETENTION)
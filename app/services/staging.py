@@ -0,0 +1,560 @@
+"""
+The staging area: files uploaded to the server, waiting to be sent to a
+workspace.
+
+Staging is split into sessions. A browser gets its session from a cookie
+set the first time it stages or lists files; scripts can create one with
+``POST /upload2/sessions`` per batch and send it in the
+``X-Staging-Session`` header. Each session has its own directory, index
+and quota, and the listing, delete and upload endpoints only see the
+caller's session, so users never see or overwrite each other's files.
+
+Files are stored in hashed shard subdirectories
+(``<dir>/<session>/<2 hex>/<name>``) so no directory grows too large.
+Files from the older flat and sharded layouts are moved into the
+``legacy-staging`` session when the area is first scanned.
+
+The area is scanned once, the first time it is used, and from then on
+the staging and delete endpoints keep the in-memory indexes up to date,
+so listing staged files never touches the disk. Every change to a
+session bumps its version, which (with a token unique to this process)
+is the listing's ETag: a client that sends it back in ``If-None-Match``
+gets a 304 until something is staged or deleted in that session.
+
+The whole area holds at most ``MYDRE_STAGING_QUOTA`` bytes and each
+session at most ``MYDRE_STAGING_SESSION_QUOTA``. A file that would take a
+session past its quota is refused (507): the session's own files are
+never deleted to make room, since the client may be about to upload
+them. Files are kept in least-recently-used order (staging a file or
+uploading it counts as a use); when a new file would exceed the area's
+quota, and whenever a file has not been used for
+``MYDRE_STAGING_MAX_AGE`` seconds, the least recently used files are
+deleted. Files pinned by an upload in progress are never evicted; the
+bytes pinned are kept as running totals, so staging a file costs the same
+however many files are staged. A session whose files are all gone is
+removed with its directory.
+
+Files still being written (hidden ``.part`` files) count against both
+quotas as their chunks reach the disk, so concurrent stagings cannot
+overshoot them. ``.part`` files left behind by a crash are deleted when
+the area is first scanned, once they have not been written to for
+``_STALE_PART_SECONDS``.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional
+from fastapi import HTTPException, Request, Response
+from app.core.config import settings
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = "mydre_staging"
+SESSION_HEADER = "X-Staging-Session"
+# Files staged before staging was split into sessions
+LEGACY_SESSION = "legacy-staging"
+
+# At least 8 characters, so a session never looks like a shard
+_SESSION_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_SHARD_PATTERN = re.compile(r"^[0-9a-f]{2}$")
+# A partial write not touched for this long was abandoned
+_STALE_PART_SECONDS = 3600
+
+
+class StagingFull(HTTPException):
+    """A staged file does not fit in the staging quota."""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=507, detail=detail)
+
+
+@dataclass
+class StagedFile:
+    session: str
+    filename: str
+    path: str
+    size: int
+    mtime: float
+    sha256: Optional[str] = None
+    last_used: float = 0.0
+    pins: int = field(default=0, repr=False)
+
+    @property
+    def key(self):
+        return (self.session, self.filename)
+
+    def to_dict(self):
+        return {
+            "filename": self.filename,
+            "path": self.path,
+            "size": self.size,
+            "mtime": self.mtime,
+            "sha256": self.sha256,
+            "last_used": self.last_used
+        }
+
+
+class StagingSession:
+    """Index and usage of one session's staged files."""
+
+    def __init__(self, name):
+        self.name = name
+        # file name -> StagedFile, least recently used first
+        self.files = OrderedDict()
+        self.used = 0
+        self.pinned_bytes = 0
+        self.version = 0
+        self.sorted = None
+
+
+def shard_of(filename) -> str:
+    """Shard subdirectory for a file name."""
+    return hashlib.sha1(filename.encode("utf-8")).hexdigest()[:2]
+
+
+def new_session() -> str:
+    return uuid.uuid4().hex
+
+
+class StagingArea:
+    """Quota-bounded, LRU-evicted staging directories, one per session."""
+
+    def __init__(self, directory, quota, session_quota, max_age):
+        self.directory = Path(directory)
+        self.quota = max(1, quota)
+        self.session_quota = max(1, session_quota)
+        self.max_age = max_age
+        self._sessions = {}
+        # (session, file name) -> StagedFile across sessions, least recently used first
+        self._files = OrderedDict()
+        self._loaded = False
+        self._used = 0
+        self._pinned_bytes = 0
+        self._pinned_files = 0
+        # Bytes of files still being written, in total and per session
+        self._in_flight = 0
+        self._session_in_flight = {}
+        self._version = 0
+        self._evictions = 0
+        self._evicted_bytes = 0
+        self._token = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+
+    def path_for(self, session, filename) -> Path:
+        return self.directory / session / shard_of(filename) / filename
+
+    def _load(self):
+        # Caller holds self._lock
+        if self._loaded:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        stale = time.time() - _STALE_PART_SECONDS
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                # Hidden files are partial writes
+                if entry.name.startswith('.'):
+                    if entry.name.endswith('.part') and entry.is_file() and entry.stat().st_mtime < stale:
+                        logger.info(f"Deleting abandoned partial file {entry.name}")
+                        Path(entry.path).unlink(missing_ok=True)
+                    continue
+                if entry.is_file() or _SHARD_PATTERN.match(entry.name):
+                    found.extend(self._migrate(entry))
+                elif entry.is_dir() and _SESSION_PATTERN.match(entry.name):
+                    for shard in os.scandir(entry.path):
+                        if shard.is_dir():
+                            found.extend(
+                                (entry.name, Path(staged.path)) for staged in os.scandir(shard.path)
+                                if not staged.name.startswith('.') and staged.is_file()
+                            )
+        for session, path in sorted(found, key=lambda item: item[1].stat().st_mtime):
+            stat = path.stat()
+            self._insert(StagedFile(
+                session, path.name, str(path.absolute()), stat.st_size, stat.st_mtime,
+                last_used=stat.st_mtime
+            ))
+        self._loaded = True
+        logger.info(
+            f"Indexed {len(self._files)} staged files ({self._used} bytes) "
+            f"in {len(self._sessions)} sessions under {self.directory}"
+        )
+
+    def _migrate(self, entry):
+        # Caller holds self._lock. Moves files from the layouts before
+        # sessions into the legacy session
+        if entry.is_file():
+            entries = [entry]
+        else:
+            entries = [staged for staged in os.scandir(entry.path) if staged.is_file()]
+        moved = []
+        for staged in entries:
+            if staged.name.startswith('.'):
+                continue
+            path = self.path_for(LEGACY_SESSION, staged.name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged.path, path)
+            moved.append((LEGACY_SESSION, path))
+        if entry.is_dir():
+            try:
+                os.rmdir(entry.path)
+            except OSError:
+                pass
+        return moved
+
+    def _insert(self, staged):
+        # Caller holds self._lock
+        session = self._sessions.get(staged.session)
+        if session is None:
+            session = self._sessions[staged.session] = StagingSession(staged.session)
+        session.files[staged.filename] = staged
+        session.used += staged.size
+        self._files[staged.key] = staged
+        self._used += staged.size
+        if staged.pins:
+            self._count_pinned(staged, 1)
+        self._changed(session)
+
+    def _changed(self, session):
+        # Caller holds self._lock
+        self._version += 1
+        session.version = self._version
+        session.sorted = None
+
+    def _drop(self, staged, delete=True):
+        # Caller holds self._lock
+        session = self._sessions[staged.session]
+        del session.files[staged.filename]
+        session.used -= staged.size
+        del self._files[staged.key]
+        self._used -= staged.size
+        if staged.pins:
+            self._count_pinned(staged, -1)
+        self._changed(session)
+        if delete:
+            Path(staged.path).unlink(missing_ok=True)
+        if not session.files:
+            self._remove_session(session)
+
+    def _count_pinned(self, staged, sign):
+        # Caller holds self._lock
+        self._pinned_bytes += sign * staged.size
+        self._pinned_files += sign
+        self._sessions[staged.session].pinned_bytes += sign * staged.size
+
+    def _remove_session(self, session):
+        # Caller holds self._lock
+        del self._sessions[session.name]
+        session_dir = self.directory / session.name
+        try:
+            for shard in list(os.scandir(session_dir)):
+                os.rmdir(shard.path)
+            os.rmdir(session_dir)
+        except OSError:
+            pass
+
+    def _use(self, staged, now):
+        # Caller holds self._lock
+        staged.last_used = now
+        self._files.move_to_end(staged.key)
+        self._sessions[staged.session].files.move_to_end(staged.filename)
+
+    def _evict(self, needed=0):
+        """
+        Drop expired files, then least recently used ones until ``needed``
+        more bytes fit in the area's quota. Caller holds self._lock.
+        """
+        evicted = []
+        freed = 0
+        expires = time.time() - self.max_age
+        # Walk from the least recently used end only as far as needed
+        for staged in self._files.values():
+            if (self._used + self._in_flight - freed + needed <= self.quota
+                    and staged.last_used > expires):
+                break
+            if not staged.pins:
+                evicted.append(staged)
+                freed += staged.size
+        for staged in evicted:
+            self._drop(staged)
+        if evicted:
+            self._evictions += len(evicted)
+            self._evicted_bytes += sum(staged.size for staged in evicted)
+            logger.info(f"Evicted {len(evicted)} staged files from the staging area")
+
+    def check_size(self, size):
+        """Raise StagingFull if a file of ``size`` bytes can never fit."""
+        limit = min(self.quota, self.session_quota)
+        if size > limit:
+            raise StagingFull(f"File is larger than the staging quota of {limit} bytes")
+
+    def etag(self, session_name) -> str:
+        with self._lock:
+            session = self._sessions.get(session_name)
+            return f'"{self._token}-{session.version if session is not None else "empty"}"'
+
+    def _release(self, session_name, nbytes):
+        # Caller holds self._lock
+        self._in_flight -= nbytes
+        left = self._session_in_flight.get(session_name, 0) - nbytes
+        if left > 0:
+            self._session_in_flight[session_name] = left
+        else:
+            self._session_in_flight.pop(session_name, None)
+
+    def reserve(self, session_name, nbytes):
+        """
+        Count ``nbytes`` more of a file being written into a session against
+        the quotas, evicting least recently used files to make room. Raises
+        StagingFull if they do not fit; pass the total reserved to
+        :meth:`add` or :meth:`release` once the file is done.
+        """
+        with self._lock:
+            self._load()
+            session = self._sessions.get(session_name)
+            session_used = (session.used if session is not None else 0) \
+                + self._session_in_flight.get(session_name, 0)
+            if session_used + nbytes > self.session_quota:
+                raise StagingFull(
+                    f"Staging session quota of {self.session_quota} bytes is used up; "
+                    f"delete staged files first"
+                )
+            if self._pinned_bytes + self._in_flight + nbytes > self.quota:
+                raise StagingFull("Staging area is full of files being uploaded, retry later")
+            self._evict(nbytes)
+            self._in_flight += nbytes
+            self._session_in_flight[session_name] = self._session_in_flight.get(session_name, 0) + nbytes
+
+    def release(self, session_name, nbytes):
+        """Return bytes reserved for a file that will not be staged after all."""
+        with self._lock:
+            self._release(session_name, nbytes)
+
+    def add(self, session_name, filename, temp_path, size, sha256=None, reserved=0) -> StagedFile:
+        """
+        Move a fully written temporary file into a session, evicting least
+        recently used files of any session to make room in the area. Raises
+        StagingFull (and deletes the temporary file) if the session's quota
+        is used up or pinned files leave too little room in the area.
+        ``reserved`` bytes reserved for the file while it was written are
+        released either way.
+        """
+        path = self.path_for(session_name, filename)
+        with self._lock:
+            self._load()
+            self._release(session_name, reserved)
+            replaced = self._files.get((session_name, filename))
+            session = self._sessions.get(session_name)
+            session_used = (session.used if session is not None else 0) \
+                + self._session_in_flight.get(session_name, 0)
+            pinned = self._pinned_bytes + self._in_flight
+            if replaced is not None:
+                session_used -= replaced.size
+                if replaced.pins:
+                    pinned -= replaced.size
+            error = None
+            if session_used + size > self.session_quota:
+                error = (
+                    f"Staging session quota of {self.session_quota} bytes is used up; "
+                    f"delete staged files first"
+                )
+            elif pinned + size > self.quota:
+                error = "Staging area is full of files being uploaded, retry later"
+            if error is None:
+                pins = 0
+                if replaced is not None:
+                    # The new file takes its place, so only forget the old one
+                    pins = replaced.pins
+                    self._drop(replaced, delete=False)
+                self._evict(size)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, path)
+                now = time.time()
+                staged = StagedFile(session_name, filename, str(path.absolute()), size, now, sha256, now, pins)
+                self._insert(staged)
+        if error is not None:
+            Path(temp_path).unlink(missing_ok=True)
+            raise StagingFull(error)
+        return staged
+
+    def remove(self, session_name, filename) -> bool:
+        """Delete a staged file; returns False if the session has no such file."""
+        with self._lock:
+            self._load()
+            staged = self._files.get((session_name, filename))
+            if staged is None:
+                return False
+            if staged.pins:
+                raise HTTPException(status_code=409, detail="File is being uploaded")
+            self._drop(staged)
+        return True
+
+    def clear(self, session_name) -> int:
+        """Delete a session's staged files, except those being uploaded."""
+        with self._lock:
+            self._load()
+            session = self._sessions.get(session_name)
+            removed = [staged for staged in (session.files.values() if session else ()) if not staged.pins]
+            for staged in removed:
+                self._drop(staged)
+        return len(removed)
+
+    def resolve(self, session_name, files: Iterable[str]) -> List[Path]:
+        """
+        Map the file names or paths a client sent to the session's staged
+        files; raises 404 for anything not staged in that session.
+        """
+        with self._lock:
+            self._load()
+            session = self._sessions.get(session_name)
+            paths = []
+            for file in files:
+                path = Path(file)
+                staged = session.files.get(path.name) if session is not None else None
+                if staged is None or (file != path.name and str(path.absolute()) != staged.path):
+                    raise HTTPException(status_code=404, detail=f"File not found: {file}")
+                paths.append(Path(staged.path))
+        return paths
+
+    def _staged_for(self, paths):
+        # Caller holds self._lock. Paths that are not staged files are skipped
+        files = []
+        root = self.directory.absolute()
+        for path in paths:
+            path = Path(path).absolute()
+            if path.parent.parent.parent != root:
+                continue
+            staged = self._files.get((path.parent.parent.name, path.name))
+            if staged is not None and staged.path == str(path):
+                files.append(staged)
+        return files
+
+    def touch(self, paths: Iterable):
+        """Mark staged files as just used."""
+        now = time.time()
+        with self._lock:
+            self._load()
+            for staged in self._staged_for(paths):
+                self._use(staged, now)
+
+    def pin_files(self, paths: Iterable) -> list:
+        """
+        Keep the staged files among ``paths`` from being evicted or deleted
+        until the returned list is passed to :meth:`unpin`.
+        """
+        now = time.time()
+        with self._lock:
+            self._load()
+            pinned = self._staged_for(paths)
+            for staged in pinned:
+                if not staged.pins:
+                    self._count_pinned(staged, 1)
+                staged.pins += 1
+                self._use(staged, now)
+        return pinned
+
+    def unpin(self, pinned: list):
+        """Release files pinned by :meth:`pin_files`."""
+        with self._lock:
+            for staged in pinned:
+                # Restaging replaces the entry, which takes over its pins
+                current = self._files.get(staged.key)
+                if current is None or not current.pins:
+                    continue
+                current.pins -= 1
+                if not current.pins:
+                    self._count_pinned(current, -1)
+
+    @contextmanager
+    def pin(self, paths: Iterable):
+        """Keep the staged files among ``paths`` pinned within the block."""
+        pinned = self.pin_files(paths)
+        try:
+            yield
+        finally:
+            self.unpin(pinned)
+
+    def page(self, session_name, offset=0, limit=1000, search: Optional[str] = None) -> dict:
+        """
+        Return a session's staged files ``offset`` to ``offset + limit`` in
+        name order, optionally only those whose name contains ``search``
+        (any case). Expired files are evicted first.
+        """
+        with self._lock:
+            self._load()
+            self._evict()
+            session = self._sessions.get(session_name)
+            if session is None:
+                files, used = [], 0
+            else:
+                if session.sorted is None:
+                    session.sorted = sorted(session.files.values(), key=lambda staged: staged.filename)
+                files, used = session.sorted, session.used
+            etag = f'"{self._token}-{session.version if session is not None else "empty"}"'
+        if search:
+            search = search.lower()
+            files = [staged for staged in files if search in staged.filename.lower()]
+        end = offset + limit
+        return {
+            "files": [staged.to_dict() for staged in files[offset:end]],
+            "total": len(files),
+            "total_bytes": sum(staged.size for staged in files),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": end if end < len(files) else None,
+            "used_bytes": used,
+            "quota_bytes": self.session_quota,
+            "etag": etag
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "sessions": len(self._sessions),
+                "files": len(self._files),
+                "used_bytes": self._used,
+                "quota_bytes": self.quota,
+                "session_quota_bytes": self.session_quota,
+                "pinned": self._pinned_files,
+                "pinned_bytes": self._pinned_bytes,
+                "in_flight_bytes": self._in_flight,
+                "evictions": self._evictions,
+                "evicted_bytes": self._evicted_bytes,
+                "version": self._version
+            }
+
+
+staging_area = StagingArea(
+    settings.STAGING_DIR,
+    settings.STAGING_QUOTA,
+    settings.STAGING_SESSION_QUOTA,
+    settings.STAGING_MAX_AGE
+)
+
+
+def staging_session(request: Request, response: Response) -> str:
+    """
+    Dependency returning the caller's staging session: the
+    ``X-Staging-Session`` header, else the session cookie, else a new
+    session whose cookie is set on the response.
+    """
+    session = request.headers.get(SESSION_HEADER)
+    if session is None:
+        session = request.cookies.get(SESSION_COOKIE) or new_session()
+        # Refreshed on every request, so it lasts as long as the files do
+        response.set_cookie(
+            SESSION_COOKIE, session, max_age=settings.STAGING_MAX_AGE,
+            httponly=True, samesite="strict"
+        )
+    if not _SESSION_PATTERN.match(session):
+        raise HTTPException(status_code=400, detail="Invalid staging session")
+    return session
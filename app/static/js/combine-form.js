@@ -232,48 +232,54 @@ const CombineConfig = {
                     return;
                 }
 
-                // Normal decryption process
+                // Normal decryption process. The PIN is also tried on every
+                // other pending file so a key set sharing one PIN needs a
+                // single request.
                 console.log('=== Starting Decryption Process ===');
+                const batch = [fileName];
+                this.uploadedFiles.forEach((data, name) => {
+                    if (name !== fileName && data.status === 'pending') {
+                        batch.push(name);
+                    }
+                });
+
                 const formData = new FormData();
-                formData.append('file', fileData.file);
-                formData.append('pin', pin);
+                batch.forEach(name => formData.append('files', this.uploadedFiles.get(name).file));
+                formData.append('pins', pin);
 
-                console.log('Sending decrypt request...');
-                const response = await fetch('/api/v1/config/decrypt', {
+                console.log('Sending batch decrypt request...');
+                const response = await fetch('/api/v1/config/decrypt-batch', {
                     method: 'POST',
                     body: formData
                 });
 
                 if (!response.ok) {
                     const errorData = await response.json().catch(() => ({}));
-                    throw new Error(errorData.error || `Decryption failed: ${response.statusText}`);
-                }
-
-                let result = await response.json();
-                console.log('Raw decrypt result:', result);
-
-                // Convert single workspace format to workspaces format if needed
-                if (!result.workspaces && result.workspace_key) {
-                    console.log('Converting single workspace format to workspaces format');
-                    result = {
-                        workspaces: {
-                            [result.workspace_name || 'Workspace']: {
-                                workspace_key: result.workspace_key,
-                                subscription_key: result.subscription_key,
-                                uploader_name: result.uploader_name
-                            }
-                        }
-                    };
+                    throw new Error(errorData.detail || `Decryption failed: ${response.statusText}`);
                 }
 
-                console.log('Processed decrypt result:', result);
+                const result = await response.json();
+                console.log('Raw batch decrypt result:', result);
+
+                let targetError = null;
+                result.results.forEach((fileResult, index) => {
+                    const name = batch[index];
+                    const data = this.uploadedFiles.get(name);
+                    if (!data) return;
+
+                    if (fileResult.status === 'success' && this.validateDecryptedStructure(fileResult.config)) {
+                        // Keep the PIN so the server can combine the encrypted files directly
+                        data.pin = pin;
+                        this.processDecryptedData(name, data, fileResult.config);
+                    } else if (name === fileName) {
+                        targetError = fileResult.message || 'Invalid decrypted data structure';
+                    }
+                });
 
-                if (!this.validateDecryptedStructure(result)) {
-                    throw new Error('Invalid decrypted data structure');
+                if (targetError) {
+                    throw new Error(targetError);
                 }
 
-                this.processDecryptedData(fileName, fileData, result);
-
             } catch (error) {
                 console.error('Decryption error:', error);
                 this.updateFileStatus(fileName, false);
@@ -531,16 +537,32 @@ const CombineConfig = {
                     throw new Error('Invalid combined data structure');
                 }
 
-                // Create FormData for encryption
+                // Let the server decrypt, merge and re-encrypt the original files
+                // when every decrypted file has a known PIN; otherwise (e.g. test
+                // files read without decryption) send the merged JSON instead.
+                const decryptedFiles = Array.from(this.uploadedFiles.values())
+                    .filter(data => data.status === 'success');
                 const formData = new FormData();
                 formData.append('pin', pin);
                 formData.append('filename', fileName);
-                formData.append('config', JSON.stringify(combinedData));
+                let endpoint;
+
+                if (decryptedFiles.length > 0 && decryptedFiles.every(data => data.pin)) {
+                    decryptedFiles.forEach(data => {
+                        formData.append('files', data.file);
+                        formData.append('pins', data.pin);
+                    });
+                    Object.keys(workspaces).forEach(name => formData.append('workspaces', name));
+                    endpoint = '/api/v1/combine/merge';
+                    console.log('Sending encrypted files for server-side merge...');
+                } else {
+                    formData.append('config', JSON.stringify(combinedData));
+                    endpoint = '/api/v1/combine/encrypt';
+                    console.log('Sending data for encryption...');
+                    console.log('Data being encrypted:', JSON.stringify(combinedData, null, 2));
+                }
 
-                console.log('Sending data for encryption...');
-                console.log('Data being encrypted:', JSON.stringify(combinedData, null, 2));
-                
-                const response = await fetch('/api/v1/combine/encrypt', {
+                const response = await fetch(endpoint, {
                     method: 'POST',
                     body: formData
                 });
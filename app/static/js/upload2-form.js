@@ -43,18 +43,23 @@ class Upload2FileHandler {
 
     async loadExistingFiles() {
         try {
-            const response = await fetch('/api/v1/upload2/files');
-            const result = await response.json();
-            
-            if (result.status === 'success') {
+            // The listing is paged; keep fetching until there is no next page
+            let offset = 0;
+            while (offset !== null) {
+                const response = await fetch(`/api/v1/upload2/files?offset=${offset}`);
+                const result = await response.json();
+                if (result.status !== 'success') {
+                    break;
+                }
                 result.files.forEach(file => {
                     this.dataFilesDict[file.filename] = file.path;
                     this.selectedFiles.add(file.filename); // Pre-select all files
                 });
-                
-                console.log('Loaded existing files:', this.dataFilesDict);
-                this.updateDataFilesGrid();
+                offset = result.next_offset;
             }
+
+            console.log('Loaded existing files:', this.dataFilesDict);
+            this.updateDataFilesGrid();
         } catch (error) {
             console.error('Failed to load existing files:', error);
         }
@@ -270,52 +275,43 @@ class Upload2FileHandler {
         const fileInfo = this.keyFiles.get(fileName);
         if (!fileInfo) return;
 
+        // Try the PIN on every other pending key file too, so a key set that
+        // shares one PIN is decrypted in a single request
+        const batch = [fileName];
+        this.keyFiles.forEach((info, name) => {
+            if (name !== fileName && info.status === 'pending') {
+                batch.push(name);
+            }
+        });
+
         try {
             const formData = new FormData();
-            formData.append('file', fileInfo.file);
-            formData.append('pin', pin);
+            batch.forEach(name => formData.append('files', this.keyFiles.get(name).file));
+            formData.append('pins', pin);
 
-            const response = await fetch('/api/v1/upload2/decrypt', {
+            const response = await fetch('/api/v1/config/decrypt-batch', {
                 method: 'POST',
                 body: formData
             });
 
             const result = await response.json();
-            console.log('Raw decryption result:', result);
-            
-            if (result.status === 'success' && result.data) {
-                fileInfo.status = 'success';
-                fileInfo.data = result.data;
-                
-                let workspacesData = typeof result.data === 'string' ? 
-                    JSON.parse(result.data) : result.data;
-                
-                console.log('Parsed workspaces data:', workspacesData);
-
-                if (workspacesData && workspacesData.workspaces) {
-                    const workspaceNames = Object.keys(workspacesData.workspaces);
-                    console.log('Found workspace names:', workspaceNames);
-
-                    workspaceNames.forEach(name => {
-                        const workspaceInfo = workspacesData.workspaces[name];
-                        console.log(`Adding workspace to grid: ${name}`, workspaceInfo);
-
-                        const workspaceId = `${name}_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
-                        this.workspaces.set(workspaceId, {
-                            name: name,
-                            key: workspaceInfo.workspace_key,
-                            subscription: workspaceInfo.subscription_key,
-                            uploader_name: workspaceInfo.uploader_name
-                        });
-                        
-                        console.log(`Added workspace with uploader_name:`, this.workspaces.get(workspaceId));
-                        this.selectedWorkspaces.add(workspaceId);
-                    });
-
-                    this.updateWorkspaceGrid();
-                }
+            console.log('Raw batch decryption result:', result);
+            if (!response.ok) {
+                throw new Error(result.detail || 'Decryption failed');
             }
-            
+
+            result.results.forEach((fileResult, index) => {
+                const name = batch[index];
+                const info = this.keyFiles.get(name);
+                if (fileResult.status === 'success') {
+                    info.status = 'success';
+                    info.data = fileResult.config;
+                    this.addDecryptedWorkspaces(fileResult.config);
+                } else if (name === fileName) {
+                    info.status = 'error';
+                }
+            });
+
             this.updateKeyFilesGrid();
         } catch (error) {
             console.error('Decryption failed:', error);
@@ -324,6 +320,33 @@ class Upload2FileHandler {
         }
     }
 
+    addDecryptedWorkspaces(workspacesData) {
+        console.log('Parsed workspaces data:', workspacesData);
+
+        if (workspacesData && workspacesData.workspaces) {
+            const workspaceNames = Object.keys(workspacesData.workspaces);
+            console.log('Found workspace names:', workspaceNames);
+
+            workspaceNames.forEach(name => {
+                const workspaceInfo = workspacesData.workspaces[name];
+                console.log(`Adding workspace to grid: ${name}`, workspaceInfo);
+
+                const workspaceId = `${name}_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+                this.workspaces.set(workspaceId, {
+                    name: name,
+                    key: workspaceInfo.workspace_key,
+                    subscription: workspaceInfo.subscription_key,
+                    uploader_name: workspaceInfo.uploader_name
+                });
+
+                console.log(`Added workspace with uploader_name:`, this.workspaces.get(workspaceId));
+                this.selectedWorkspaces.add(workspaceId);
+            });
+
+            this.updateWorkspaceGrid();
+        }
+    }
+
     updateWorkspaceGrid() {
         const grid = document.getElementById('upload2-workspace-grid');
         if (!grid) {
@@ -552,37 +575,208 @@ class Upload2FileHandler {
             console.log('Starting upload for workspaces:', selectedWorkspaces);
             console.log('Files to upload:', selectedFiles);
 
-            // Upload to each selected workspace
-            for (const workspace of selectedWorkspaces) {
-                const uploadData = {
+            // Upload to all selected workspaces in one request; the server
+            // reads each file once and streams it to every workspace
+            const uploadData = {
+                workspaces: selectedWorkspaces.map(workspace => ({
                     workspace_name: workspace.name,
                     workspace_key: workspace.key,
                     subscription_key: workspace.subscription,
-                    uploader_name: workspace.uploader_name,
-                    files: selectedFiles
-                };
-
-                console.log('Upload data being sent:', uploadData); // Debug log
-
-                const response = await fetch('/api/v1/upload2/upload', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(uploadData)
-                });
+                    uploader_name: workspace.uploader_name
+                })),
+                files: selectedFiles
+            };
+            // Compress text-like files on the fly if chosen
+            const compression = document.getElementById('upload2-compression');
+            if (compression && compression.value) {
+                uploadData.compression = compression.value;
+            }
+            // Pack small files into tar archives to save a request per file
+            const bundle = document.getElementById('upload2-bundle');
+            if (bundle && bundle.checked) {
+                uploadData.bundle_small_files = true;
+            }
 
-                const result = await response.json();
-                if (!response.ok) {
-                    throw new Error(result.detail || 'Upload failed');
-                }
-                console.log(`Upload result for workspace ${workspace.name}:`, result);
+            console.log('Upload data being sent:', uploadData); // Debug log
+
+            // Submit the upload as a background job and follow its progress
+            const response = await fetch('/api/v1/jobs/upload', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(uploadData)
+            });
+
+            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.detail || 'Upload failed');
+            }
+
+            const job = await this.waitForJob(result.job_id);
+            (job.results || []).forEach(workspaceResult => {
+                console.log(`Upload result for workspace ${workspaceResult.workspace_name}:`, workspaceResult);
+            });
+            if (job.state !== 'completed') {
+                this.showUploadStatus(`Upload failed: ${job.errors.join('; ') || `Upload ${job.state}`}`);
+                this.offerResume(job.results || [], uploadData.workspaces);
+                return;
             }
 
             console.log('All uploads completed');
 
         } catch (error) {
             console.error('Upload failed:', error);
+            this.showUploadStatus(`Upload failed: ${error.message}`);
+        }
+    }
+
+    waitForJob(jobId) {
+        // Follow live progress over Server-Sent Events; fall back to polling
+        if (!window.EventSource) {
+            return this.pollJob(jobId);
+        }
+
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/api/v1/jobs/${jobId}/events`);
+            source.addEventListener('progress', (e) => {
+                this.renderProgress(JSON.parse(e.data));
+            });
+            source.addEventListener('done', (e) => {
+                source.close();
+                const job = JSON.parse(e.data);
+                this.renderProgress(job);
+                resolve(job);
+            });
+            source.onerror = () => {
+                // Stream dropped before the job finished
+                source.close();
+                this.pollJob(jobId).then(resolve, reject);
+            };
+        });
+    }
+
+    async pollJob(jobId) {
+        while (true) {
+            const response = await fetch(`/api/v1/jobs/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.detail || 'Failed to get upload status');
+            }
+
+            const percent = job.total_bytes ? Math.floor(100 * job.bytes_transferred / job.total_bytes) : 0;
+            this.showUploadStatus(`Upload ${job.state}: ${percent}%`);
+
+            if (['completed', 'failed', 'cancelled'].includes(job.state)) {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
+    renderProgress(progress) {
+        const status = document.getElementById('upload2-progress');
+        if (!status) return;
+
+        const formatBytes = (bytes) => {
+            const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+            let value = bytes;
+            let unit = 0;
+            while (value >= 1024 && unit < units.length - 1) {
+                value /= 1024;
+                unit++;
+            }
+            return `${value.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+        };
+        const describe = (sent, total, rate, eta) => {
+            const percent = total ? Math.min(100, Math.floor(100 * sent / total)) : 0;
+            let text = `${percent}% (${formatBytes(sent)} of ${formatBytes(total)})`;
+            if (rate) text += `, ${formatBytes(rate)}/s`;
+            if (eta) text += `, ${Math.ceil(eta)}s left`;
+            return text;
+        };
+
+        status.innerHTML = '';
+        const summary = document.createElement('div');
+        summary.textContent = `Upload ${progress.state}: ` + describe(
+            progress.bytes_transferred, progress.total_bytes,
+            progress.rate_bytes_per_second, progress.eta_seconds
+        );
+        status.appendChild(summary);
+
+        progress.workspaces.forEach(workspace => {
+            const row = document.createElement('div');
+            row.className = 'upload-progress-workspace';
+            row.textContent = `${workspace.workspace_name}: ` + describe(
+                workspace.bytes_sent, workspace.total_bytes,
+                workspace.rate_bytes_per_second, workspace.eta_seconds
+            );
+            status.appendChild(row);
+
+            progress.files
+                .filter(file => file.workspace_name === workspace.workspace_name && file.size !== null)
+                .forEach(file => {
+                    const fileRow = document.createElement('div');
+                    fileRow.className = 'upload-progress-file';
+                    fileRow.textContent = `${file.filename}: ` + describe(file.bytes_sent, file.size);
+                    status.appendChild(fileRow);
+                });
+        });
+    }
+
+    offerResume(results, workspaces) {
+        // Workspaces that failed can be finished later without sending
+        // the files they already have again
+        const status = document.getElementById('upload2-progress');
+        if (!status) return;
+
+        results.filter(result => result.resume_id).forEach(result => {
+            const workspace = workspaces.find(w => w.workspace_name === result.workspace_name);
+            if (!workspace) return;
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'upload-resume';
+            button.textContent = `Resume upload to ${result.workspace_name}`;
+            button.addEventListener('click', () => this.resumeUpload(result.resume_id, workspace));
+            status.appendChild(button);
+        });
+    }
+
+    async resumeUpload(resumeId, workspace) {
+        try {
+            const response = await fetch(`/api/v1/resumable/${resumeId}/resume`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    workspace_key: workspace.workspace_key,
+                    subscription_key: workspace.subscription_key
+                })
+            });
+
+            const result = await response.json();
+            if (!response.ok) {
+                throw new Error(result.detail || 'Resume failed');
+            }
+
+            const job = await this.waitForJob(result.job_id);
+            if (job.state !== 'completed') {
+                this.showUploadStatus(`Upload failed: ${job.errors.join('; ') || `Upload ${job.state}`}`);
+                this.offerResume([{ workspace_name: workspace.workspace_name, resume_id: resumeId }], [workspace]);
+                return;
+            }
+            this.showUploadStatus(`Upload to ${workspace.workspace_name} completed`);
+        } catch (error) {
+            console.error('Resume failed:', error);
+            this.showUploadStatus(`Resume failed: ${error.message}`);
+        }
+    }
+
+    showUploadStatus(message) {
+        const status = document.getElementById('upload2-progress');
+        if (status) {
+            status.textContent = message;
         }
     }
 }
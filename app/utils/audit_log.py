@@ -0,0 +1,236 @@
+"""
+Upload audit log.
+
+Records are JSON lines written by a background thread: callers only put a
+record on a bounded queue, so logging never blocks an upload (if the
+queue is full the record is dropped and counted). The writer keeps the
+file open, writes whatever has queued up in one go and rotates the file
+by size and age, keeping ``MYDRE_AUDIT_LOG_BACKUPS`` old files.
+
+:meth:`AuditLog.read` pages through the newest records first by reading
+the files backwards, so its cost depends on the page, not on the size of
+the log. Pages continue from a cursor naming a file (by inode, which
+rotation keeps) and the byte position of the last record returned, so
+records written or rotated away in between do not shift later pages.
+Filtering by workspace only decodes lines that mention the workspace.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from app.core.config import settings
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# Most records written per batch
+_BATCH_SIZE = 512
+_READ_BLOCK_SIZE = 64 * 1024
+
+
+def _reverse_lines(log_file, end):
+    """
+    Yield ``(start, line)`` for the lines of a file that end before byte
+    ``end``, last to first, reading it in blocks from the end.
+    """
+    position = end
+    remainder = b""
+    while position > 0:
+        size = min(_READ_BLOCK_SIZE, position)
+        position -= size
+        log_file.seek(position)
+        lines = (log_file.read(size) + remainder).split(b"\n")
+        remainder = lines.pop(0)
+        start = position + len(remainder) + 1
+        starts = []
+        for line in lines:
+            starts.append(start)
+            start += len(line) + 1
+        for start, line in zip(reversed(starts), reversed(lines)):
+            if line:
+                yield start, line
+    if remainder:
+        yield 0, remainder
+
+
+class AuditLog:
+    """Background, batched, rotating JSON-lines log."""
+
+    def __init__(self, path, max_bytes, backups, rotate_seconds, queue_size):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = max(0, backups)
+        self.rotate_seconds = rotate_seconds
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+        self._written = 0
+        self._dropped = 0
+        self._rotations = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                self._thread.start()
+
+    def record(self, event, **fields):
+        """Queue a record; never blocks."""
+        if self._thread is None:
+            self._start()
+        entry = {"time": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            stop = False
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.warning(f"Could not write upload audit log: {str(e)}")
+            if stop:
+                break
+        self._close_file()
+
+    def _open_file(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, batch):
+        if self._file is None:
+            self._open_file()
+        elif (self._file.tell() >= self.max_bytes
+              or time.time() - self._opened_at >= self.rotate_seconds):
+            self._rotate()
+        self._file.write("".join(json.dumps(entry) + "\n" for entry in batch))
+        self._file.flush()
+        with self._lock:
+            self._written += len(batch)
+
+    def _rotate(self):
+        self._close_file()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                backup = self.path.with_name(f"{self.path.name}.{index}")
+                if backup.exists():
+                    os.replace(backup, self.path.with_name(f"{self.path.name}.{index + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        with self._lock:
+            self._rotations += 1
+        self._open_file()
+
+    def read(self, cursor: Optional[str] = None, limit=100, workspace_name: Optional[str] = None):
+        """
+        Return a page of up to ``limit`` records, newest first, starting
+        after ``cursor``. Pass the returned ``next_cursor`` as ``cursor`` for
+        the next page; it is None once the log is exhausted. Raises
+        ValueError for a malformed cursor.
+        """
+        inode = end = None
+        if cursor is not None:
+            try:
+                inode, end = (int(part) for part in cursor.split("-"))
+            except ValueError:
+                raise ValueError(f"Invalid audit log cursor: {cursor}")
+        # Records are written by json.dumps, so a record for the workspace
+        # contains exactly this; other lines need not be decoded
+        needle = None
+        if workspace_name is not None:
+            needle = f'"workspace_name": {json.dumps(workspace_name)}'.encode()
+        paths = [self.path] + [
+            self.path.with_name(f"{self.path.name}.{index}") for index in range(1, self.backups + 1)
+        ]
+        entries = []
+        last = None
+        for path in paths:
+            try:
+                log_file = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with log_file:
+                file_inode = os.fstat(log_file.fileno()).st_ino
+                if inode is not None:
+                    # Newer files than the cursor's were read already
+                    if file_inode != inode:
+                        continue
+                    inode = None
+                    file_end = end
+                else:
+                    file_end = log_file.seek(0, os.SEEK_END)
+                for start, line in _reverse_lines(log_file, file_end):
+                    if needle is not None and needle not in line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if workspace_name is not None and entry.get("workspace_name") != workspace_name:
+                        continue
+                    if len(entries) == limit:
+                        return {"entries": entries, "limit": limit, "next_cursor": last}
+                    entries.append(entry)
+                    last = f"{file_inode}-{start}"
+        return {"entries": entries, "limit": limit, "next_cursor": None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self._written,
+                "dropped": self._dropped,
+                "rotations": self._rotations
+            }
+
+    def close(self, timeout=5):
+        """Write out queued records and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+
+audit_log = AuditLog(
+    settings.AUDIT_LOG_PATH,
+    settings.AUDIT_LOG_MAX_BYTES,
+    settings.AUDIT_LOG_BACKUPS,
+    settings.AUDIT_LOG_ROTATE_SECONDS,
+    settings.AUDIT_LOG_QUEUE_SIZE
+)
@@ -0,0 +1,114 @@
+"""
+Bundling of small files into tar archives.
+
+Each small file uploaded as its own blob costs a request round trip,
+however few bytes it holds. With bundling, files under
+``MYDRE_BUNDLE_THRESHOLD`` bytes are packed into tar archives of at most
+``MYDRE_BUNDLE_MAX_BYTES`` bytes and ``MYDRE_BUNDLE_MAX_FILES`` files. The
+archives are streamed straight into blobs (compressed with the upload's
+compression, if any), and the manifest lists which archive holds each
+file. Larger files are still uploaded on their own.
+"""
+
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.utils.compression import StreamCompressor
+from app.utils.manifest import HashingReader
+import os
+import tarfile
+import time
+import uuid
+
+
+def plan_bundles(local_file_paths, threshold=None, max_bytes=None,
+                 max_files=None) -> Tuple[List[List[str]], List[str]]:
+    """
+    Split files into groups to archive together and files to upload alone.
+
+    Returns ``(bundles, singles)``; files keep their order. A group of one
+    file is not worth an archive, so it is uploaded alone.
+    """
+    threshold = settings.BUNDLE_THRESHOLD if threshold is None else threshold
+    max_bytes = max_bytes or settings.BUNDLE_MAX_BYTES
+    max_files = max_files or settings.BUNDLE_MAX_FILES
+    bundles = []
+    singles = []
+    current = []
+    current_bytes = 0
+    for local_file_path in local_file_paths:
+        size = os.path.getsize(local_file_path)
+        if size >= threshold:
+            singles.append(local_file_path)
+            continue
+        if current and (current_bytes + size > max_bytes or len(current) >= max_files):
+            bundles.append(current)
+            current, current_bytes = [], 0
+        current.append(local_file_path)
+        current_bytes += size
+    if current:
+        bundles.append(current)
+    singles.extend(bundle[0] for bundle in bundles if len(bundle) == 1)
+    return [bundle for bundle in bundles if len(bundle) > 1], singles
+
+
+def bundle_name(compression: Optional[str] = None) -> str:
+    """A unique blob name for a new archive."""
+    name = f"bundle-{uuid.uuid4().hex[:12]}.tar"
+    if compression:
+        name += StreamCompressor(compression).extension
+    return name
+
+
+class _Sink:
+    # The file object tarfile writes to: optionally compresses, then hands
+    # the bytes on
+    def __init__(self, write, compressor):
+        self._write = write
+        self._compressor = compressor
+
+    def write(self, data):
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        if data:
+            self._write(data)
+        return len(data)
+
+    def close(self):
+        if self._compressor is not None:
+            tail = self._compressor.flush()
+            if tail:
+                self._write(tail)
+
+
+class TarBundle:
+    """
+    Streams a tar archive of files to ``write(data)``.
+
+    Files are read once: the same pass that copies a file into the
+    archive computes its SHA-256. Call :meth:`close` to end the archive.
+    """
+
+    def __init__(self, write, compression: Optional[str] = None):
+        self._sink = _Sink(write, StreamCompressor(compression) if compression else None)
+        self._tar = tarfile.open(fileobj=self._sink, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def add(self, local_file_path) -> dict:
+        """Append a file; returns its ``size``, ``sha256`` and ``duration``."""
+        started = time.monotonic()
+        with open(local_file_path, "rb") as source:
+            stat = os.fstat(source.fileno())
+            info = tarfile.TarInfo(os.path.basename(local_file_path))
+            info.size = stat.st_size
+            info.mtime = stat.st_mtime
+            info.mode = 0o644
+            reader = HashingReader(source)
+            self._tar.addfile(info, reader)
+        return {
+            "size": info.size,
+            "sha256": reader.hexdigest(),
+            "duration": time.monotonic() - started
+        }
+
+    def close(self):
+        self._tar.close()
+        self._sink.close()
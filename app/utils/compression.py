@@ -0,0 +1,123 @@
+"""
+Streaming compression of files on their way to a workspace.
+
+An upload can ask for ``gzip`` or, when the optional ``zstandard``
+package is installed, ``zstd``. Files are compressed chunk by chunk as
+they are read for the upload, so no compressed copy is ever written to
+disk, and the blob gets the format's extension (``data.csv`` becomes
+``data.csv.gz``).
+
+Compressing data that is already compressed only costs CPU, so a file
+is sent as is when its extension is a known compressed format or when a
+sample of its first bytes looks random (high byte entropy), and also
+when another file of the same upload already has the compressed name
+(``data.csv`` is not compressed next to a ``data.csv.gz``), so one blob
+never overwrites the other.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+import logging
+import math
+import zlib
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+
+# Formats that are compressed already (including zip-based office files)
+COMPRESSED_EXTENSIONS = {
+    ".gz", ".tgz", ".zip", ".bz2", ".xz", ".zst", ".lz4", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mov", ".avi", ".mkv", ".ogg", ".flac",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".jar", ".parquet", ".mydre",
+}
+
+# Bytes sampled from the start of a file, and the entropy (bits per byte)
+# above which the sample is taken to be compressed or encrypted already
+SAMPLE_SIZE = 64 * 1024
+ENTROPY_THRESHOLD = 7.5
+# Smaller files gain too little to be worth it
+MIN_SIZE = 1024
+
+
+def available_modes():
+    return [GZIP] + ([ZSTD] if zstandard is not None else [])
+
+
+def check_mode(mode: Optional[str]):
+    """Raise ValueError for a compression mode this server cannot provide."""
+    if mode is not None and mode not in available_modes():
+        raise ValueError(
+            f"Unsupported compression {mode!r}; available: {', '.join(available_modes())}"
+        )
+
+
+def entropy(data: bytes) -> float:
+    """Shannon entropy of ``data`` in bits per byte (0 to 8)."""
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def worth_compressing(local_file_path) -> bool:
+    """Guess from the extension and a sample whether the file will compress."""
+    path = Path(local_file_path)
+    if path.suffix.lower() in COMPRESSED_EXTENSIONS:
+        return False
+    if path.stat().st_size < MIN_SIZE:
+        return False
+    with open(path, "rb") as sample_file:
+        sample = sample_file.read(SAMPLE_SIZE)
+    return entropy(sample) < ENTROPY_THRESHOLD
+
+
+def compression_for(mode: Optional[str], local_file_path, file_names=()) -> Optional[str]:
+    """
+    The compression to use for a file: ``mode``, or None to send it as is.
+    ``file_names`` are the names of the other files uploaded with it.
+    """
+    if mode is None or not worth_compressing(local_file_path):
+        return None
+    blob_name = Path(local_file_path).name + EXTENSIONS[mode]
+    if blob_name in file_names:
+        logger.warning(f"Not compressing {Path(local_file_path).name}: {blob_name} is uploaded too")
+        return None
+    return mode
+
+
+class StreamCompressor:
+    """Incremental compressor: feed chunks to :meth:`compress`, then :meth:`flush` once."""
+
+    def __init__(self, mode):
+        check_mode(mode)
+        self.mode = mode
+        self.extension = EXTENSIONS[mode]
+        if mode == GZIP:
+            # wbits 31: gzip header and trailer, so the blob is a valid .gz file
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        else:
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def compress(self, data: bytes) -> bytes:
+        self.bytes_in += len(data)
+        output = self._compressor.compress(data)
+        self.bytes_out += len(output)
+        return output
+
+    def flush(self) -> bytes:
+        output = self._compressor.flush()
+        self.bytes_out += len(output)
+        return output
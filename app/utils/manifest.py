@@ -0,0 +1,148 @@
+"""
+Upload manifest for a workspace container.
+
+Entries are collected in memory as each file finishes uploading (name,
+size, SHA-256 and how long the upload took, plus the compression and
+stored size of compressed files and the archive holding bundled files),
+along with the compression and stored size of each archive, and the
+manifest is written to the
+container once, just before it is committed. Checksums (of the original
+data) are taken as it is read for the upload, never in a separate pass.
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import List, Optional
+import hashlib
+import json
+import threading
+
+
+def sanitize_filename(name):
+    """Sanitize the user name to create a valid filename."""
+    # Replace invalid characters with underscores
+    return ''.join(c if c.isalnum() or c in (' ', '_') else '_' for c in name)
+
+
+class HashingReader:
+    """Read-only file wrapper that hashes everything read through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self._sha256.update(data)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        # Seeking back would hash bytes twice
+        return False
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    filename: str
+    size: int
+    sha256: Optional[str]
+    duration: Optional[float]
+    compression: Optional[str] = None
+    stored_size: Optional[int] = None
+    archive: Optional[str] = None
+    # The blob holding the file: its name, the compressed name or the archive
+    blob_name: Optional[str] = None
+
+
+class UploadManifest:
+    """Files uploaded to one container, recorded as they finish."""
+
+    def __init__(self):
+        self._entries = {}
+        self._archives = {}
+        self._lock = threading.Lock()
+
+    def add(self, filename, size, sha256=None, duration=None, compression=None, stored_size=None,
+            archive=None, blob_name=None):
+        entry = ManifestEntry(
+            filename, size, sha256, round(duration, 3) if duration is not None else None,
+            compression, stored_size, archive, blob_name or archive or filename
+        )
+        with self._lock:
+            self._entries[filename] = entry
+
+    def add_archive(self, name, compression=None, stored_size=None):
+        """Record the compression and stored size of an archive of bundled files."""
+        with self._lock:
+            self._archives[name] = {"compression": compression, "stored_size": stored_size}
+
+    def get(self, filename) -> Optional[ManifestEntry]:
+        with self._lock:
+            return self._entries.get(filename)
+
+    def entries(self) -> List[ManifestEntry]:
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda entry: entry.filename)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def to_text(self, uploader_name, uploaded_on: datetime) -> str:
+        lines = [
+            f"Uploaded by: {uploader_name}\n",
+            f"Uploaded on: {uploaded_on:%Y-%m-%d %H:%M:%S}\n\n",
+            "List of all the uploaded files:\n"
+        ]
+        for entry in self.entries():
+            details = [f"{entry.size} bytes"]
+            if entry.compression:
+                details.append(f"{entry.compression} {entry.stored_size} bytes as {entry.blob_name}")
+            if entry.archive:
+                details.append(f"in {entry.archive}")
+            if entry.sha256:
+                details.append(f"sha256 {entry.sha256}")
+            if entry.duration is not None:
+                details.append(f"{entry.duration:.2f} s")
+            lines.append(f"- {entry.filename} ({', '.join(details)})\n")
+        return ''.join(lines)
+
+    def to_json(self, uploader_name, workspace_name, uploaded_on: datetime) -> str:
+        entries = self.entries()
+        with self._lock:
+            recorded = dict(self._archives)
+        archives = {}
+        stored_bytes = 0
+        for entry in entries:
+            if entry.archive:
+                archives.setdefault(entry.archive, []).append(entry)
+            else:
+                stored_bytes += entry.stored_size if entry.compression else entry.size
+        archive_list = []
+        for name, members in sorted(archives.items()):
+            archive = recorded.get(name, {})
+            stored_size = archive.get("stored_size")
+            # An archive's size is only unknown if it predates this record;
+            # its files' sizes are then the best estimate
+            stored_bytes += stored_size if stored_size is not None else sum(entry.size for entry in members)
+            archive_list.append({
+                "name": name,
+                "compression": archive.get("compression"),
+                "stored_size": stored_size,
+                "files": [entry.filename for entry in members]
+            })
+        return json.dumps({
+            "uploaded_by": uploader_name,
+            "workspace_name": workspace_name,
+            "uploaded_on": uploaded_on.isoformat(timespec="seconds"),
+            "total_bytes": sum(entry.size for entry in entries),
+            "total_stored_bytes": stored_bytes,
+            "files": [asdict(entry) for entry in entries],
+            "archives": archive_list
+        }, indent=2)
@@ -0,0 +1,122 @@
+"""
+Incremental multipart/form-data reader.
+
+Starlette's ``UploadFile`` spools every part before the handler runs and
+handlers then tend to ``await file.read()`` the whole thing. This module
+parses the request body as it arrives instead, so a handler can move each
+part to its destination chunk by chunk with bounded memory.
+"""
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Union
+
+try:
+    from python_multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+
+
+class MultipartError(ValueError):
+    """Raised for a malformed or non-multipart request body."""
+
+
+@dataclass
+class PartStart:
+    """Start of a form part; followed by its data chunks and a PART_END."""
+    name: str
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+
+    @property
+    def is_file(self):
+        return self.filename is not None
+
+
+PART_END = object()
+
+Event = Union[PartStart, bytes, object]
+
+
+async def iter_multipart(request) -> AsyncIterator[Event]:
+    """
+    Yield the parts of a multipart request as a flat stream of events.
+
+    Each part produces a :class:`PartStart`, zero or more ``bytes`` chunks
+    and then :data:`PART_END`. Only the chunk of the body currently being
+    parsed is held in memory. A body that stops before the closing
+    boundary (a truncated request) raises MultipartError once it ends, so
+    a partly received part is never mistaken for a complete one.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise MultipartError("Expected a multipart/form-data request")
+
+    events = []
+    ended = False
+    header_field = bytearray()
+    header_value = bytearray()
+    headers = {}
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise MultipartError("Form part without a name")
+        filename = options.get(b"filename")
+        content_type = headers.get(b"content-type")
+        events.append(PartStart(
+            name=options[b"name"].decode("latin-1"),
+            filename=filename.decode("utf-8", "replace") if filename is not None else None,
+            content_type=content_type.decode("latin-1") if content_type else None
+        ))
+
+    def on_part_data(data, start, end):
+        events.append(bytes(data[start:end]))
+
+    def on_part_end():
+        events.append(PART_END)
+
+    def on_end():
+        nonlocal ended
+        ended = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            parser.write(chunk)
+            for event in events:
+                yield event
+            events.clear()
+        parser.finalize()
+        if not ended:
+            raise MultipartError("Multipart body ended before its closing boundary")
+    except MultipartParseError as e:
+        raise MultipartError(f"Malformed multipart body: {str(e)}")
+    for event in events:
+        yield event
@@ -7,16 +7,319 @@ This module handles the secure file upload process to myDRE workspaces.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from azure.storage.blob import ContainerClient
+from azure.storage.blob import BlobBlock, ContainerClient
+from app.core.concurrency import api_limiter, blob_limiter
+from app.core.config import settings
+from app.core.memory import memory_budget
+from app.services.history import ERROR, SUCCESS, history_store
+from app.utils.audit_log import audit_log
+from app.utils.bundle import TarBundle, bundle_name, plan_bundles
+from app.utils.compression import EXTENSIONS, StreamCompressor, check_mode, compression_for
+from app.utils.manifest import HashingReader, UploadManifest, sanitize_filename
 import base64
+import hashlib
+import http.cookiejar
+import logging
 import os
+import threading
+import time
 
+logger = logging.getLogger(__name__)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Return the process-wide HTTP session for the myDRE management API.
+
+    The session keeps a pool of keep-alive connections that is shared by
+    every Upload instance, so container create/commit calls reuse open
+    TCP+TLS connections instead of handshaking each time. Its cookie jar
+    refuses every cookie, so a cookie set in a response to one workspace's
+    request is never sent with another's and sharing it between threads
+    is safe.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=settings.HTTP_POOL_SIZE
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Connection'] = 'keep-alive'
+            session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            _session = session
+        return _session
+
+def _request_timeout():
+    return (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+
+def http_pool_stats():
+    """Return request and connection counters for the shared HTTP session."""
+    with _session_lock:
+        session = _session
+    stats = {
+        "pool_size": settings.HTTP_POOL_SIZE,
+        "hosts": 0,
+        "requests": 0,
+        "connections_opened": 0,
+        "connections_reused": 0
+    }
+    if session is None:
+        return stats
+    pools = session.get_adapter('https://').poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["hosts"] += 1
+        stats["requests"] += pool.num_requests
+        stats["connections_opened"] += pool.num_connections
+    stats["connections_reused"] = max(0, stats["requests"] - stats["connections_opened"])
+    return stats
+
+def close_session():
+    """Close the shared HTTP session and its pooled connections."""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def _container_client(container_url):
+    """A blob client for a container whose throttled responses feed the blob limiter."""
+    return ContainerClient.from_container_url(
+        container_url, raw_response_hook=blob_limiter.observe_response
+    )
+
+
+class UploadCancelled(Exception):
+    """Raised when an upload is stopped through its cancel event."""
+
+
+def block_id(index):
+    """Return the block ID of the block at ``index`` (IDs must share one length)."""
+    return f'{index:08d}'
+
+
+def writer_memory(block_size=None, max_concurrency=None):
+    """
+    Bytes a BlockBlobWriter reserves up front: ``MYDRE_BLOCK_CONCURRENCY``
+    blocks in flight (fewer if ``max_concurrency`` is lower) plus the one
+    buffered.
+    """
+    blocks = min(max_concurrency or settings.BLOCK_CONCURRENCY, settings.BLOCK_CONCURRENCY)
+    return (max(1, blocks) + 1) * (block_size or settings.BLOCK_SIZE)
+
+
+class BlockBlobWriter:
+    """
+    Write-only file-like object that uploads to a block blob.
+
+    Data is cut into ``block_size`` blocks that are staged in parallel;
+    :meth:`close` stages the remainder and commits the block list. How many
+    ``stage_block`` calls are in flight follows the blob limiter's current
+    limit, up to ``max_concurrency`` (default
+    ``MYDRE_BLOB_CONCURRENCY_MAX``). Memory for ``MYDRE_BLOCK_CONCURRENCY``
+    of them plus the block being filled is reserved from the memory budget
+    for the writer's lifetime, unless ``reserve_memory`` is False because
+    the caller reserved it already (see :func:`writer_memory`); each block
+    beyond that is only sent when the budget can spare it right away.
+
+    ``progress`` is called with the total number of bytes staged so far after
+    every block, ``on_block_staged(block_id, offset, length)`` after each
+    block is staged, ``on_commit(writer)`` once the blob is committed, and
+    setting ``cancel_event`` makes the next write or close raise
+    UploadCancelled. With ``checksum`` the SHA-256 of the data written is
+    available as :attr:`sha256` after closing.
+    """
+
+    def __init__(self, blob_client, block_size=None, max_concurrency=None,
+                 progress=None, cancel_event=None, on_block_staged=None,
+                 on_commit=None, checksum=True, reserve_memory=True):
+        self.blob_client = blob_client
+        self.block_size = block_size or settings.BLOCK_SIZE
+        self.max_concurrency = max(1, max_concurrency or settings.BLOB_CONCURRENCY_MAX)
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.on_block_staged = on_block_staged
+        self.on_commit = on_commit
+        self._sha256 = hashlib.sha256() if checksum else None
+        self.started_at = time.monotonic()
+        self.duration = None
+        self._reserved = 0
+        if reserve_memory:
+            self._reserved = memory_budget.acquire(writer_memory(self.block_size, self.max_concurrency))
+        # Blocks in flight the memory reserved covers, and extra ones granted since
+        self._blocks = max(1, min(self.max_concurrency, settings.BLOCK_CONCURRENCY))
+        self._extra_reserved = 0
+        self.bytes_written = 0
+        self.bytes_staged = 0
+        self._staged_lock = threading.Lock()
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="block"
+        )
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise UploadCancelled("Upload cancelled")
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed BlockBlobWriter")
+        self._check_cancelled()
+        if self._sha256 is not None:
+            self._sha256.update(data)
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._stage(block)
+        return len(data)
+
+    def _in_flight_limit(self):
+        # As many blocks as the blob limiter lets through, while memory allows
+        limit = min(self.max_concurrency, blob_limiter.limit)
+        while self._blocks < limit:
+            extra = memory_budget.try_acquire(self.block_size)
+            if not extra:
+                break
+            self._extra_reserved += extra
+            self._blocks += 1
+        return min(limit, self._blocks)
+
+    def _stage(self, block):
+        # Bound the blocks in flight, surfacing the first staging error
+        while len(self._pending) >= self._in_flight_limit():
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        current_id = block_id(len(self._block_ids))
+        offset = len(self._block_ids) * self.block_size
+        self._block_ids.append(current_id)
+        self._pending.add(self._executor.submit(self._stage_block, current_id, offset, block))
+
+    def _stage_block(self, current_id, offset, block):
+        with blob_limiter.request("stage_block", len(block)):
+            self.blob_client.stage_block(current_id, block, length=len(block))
+        if self.on_block_staged is not None:
+            self.on_block_staged(current_id, offset, len(block))
+        self._count_staged(len(block))
+
+    def _count_staged(self, length):
+        with self._staged_lock:
+            self.bytes_staged += length
+            staged = self.bytes_staged
+        if self.progress is not None:
+            self.progress(staged)
+
+    def skip_block(self, block):
+        """
+        Add the next block to the blob without staging it.
+
+        Used when resuming: the block was staged by an earlier attempt and is
+        still on the server; its data is only needed for the checksum. Only
+        valid between whole-block writes.
+        """
+        if self.closed:
+            raise ValueError("write to closed BlockBlobWriter")
+        if self._buffer:
+            raise ValueError("skip_block called with a partial block buffered")
+        if self._sha256 is not None:
+            self._sha256.update(block)
+        self._block_ids.append(block_id(len(self._block_ids)))
+        self.bytes_written += len(block)
+        self._count_staged(len(block))
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest() if self._sha256 is not None else None
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Stage any buffered data, wait for all blocks and commit the blob."""
+        if self.closed:
+            return
+        try:
+            self._check_cancelled()
+            if self._buffer:
+                self._stage(bytes(self._buffer))
+                self._buffer = bytearray()
+            for future in self._pending:
+                future.result()
+            self._pending = set()
+            self._check_cancelled()
+            with blob_limiter.request("commit_block_list"):
+                self.blob_client.commit_block_list([BlobBlock(block_id=i) for i in self._block_ids])
+            self.duration = time.monotonic() - self.started_at
+        finally:
+            self.abort()
+        if self.on_commit is not None:
+            self.on_commit(self)
+
+    def abort(self):
+        """Stop without committing; staged blocks are left uncommitted."""
+        self.closed = True
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        memory_budget.release(self._reserved + self._extra_reserved)
+        self._reserved = 0
+        self._extra_reserved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
 
 
 class Upload:
-    """Handles secure file uploads to myDRE workspace."""
-    def __init__(self, workspace_name, workspace_key, subscription_key, uploader_name):
+    """
+    Handles secure file uploads to myDRE workspace.
+
+    ``progress_callback(file_name, bytes_sent)`` is called as data for a
+    file is sent (``bytes_sent`` is cumulative for that file), and setting
+    ``cancel_event`` stops the upload with UploadCancelled at the next
+    file, block or commit.
+
+    With ``resume_state`` (a ResumableUpload) the container location and
+    the blocks staged for every file are recorded as the upload goes, and
+    an upload started from existing state reuses its container and skips
+    work that is already done. Every file upload, and every failed one, is
+    added to the upload history under ``job_id``.
+
+    With ``compression`` (``"gzip"`` or ``"zstd"``) files that look
+    compressible are compressed on the fly and stored with the format's
+    extension; the manifest records original and compressed sizes. With
+    ``bundle`` :meth:`upload_files` packs small files into tar archives.
+    """
+    def __init__(self, workspace_name, workspace_key, subscription_key, uploader_name,
+                 progress_callback=None, cancel_event=None, resume_state=None, job_id=None,
+                 compression=None, bundle=False):
+        check_mode(compression)
         self.workspace_name = workspace_name
         # self.workspace_description = w_description
         self.workspace_key = workspace_key
@@ -24,12 +327,31 @@ class Upload:
         self.uploader = uploader_name
         self.BASE_URL = 'https://andreanl-api-management.azure-api.net/v1'
         self.container_location = ''
+        self.container_client = None  # One client per workspace container
         self.uploaded_files = []  # Keep track of uploaded files
-        self.log_file_path = os.path.join(os.path.dirname(__file__), 'upload_log.txt')
+        self.manifest = UploadManifest()  # Size, checksum and timing of each uploaded file
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        self.resume_state = resume_state
+        self.job_id = job_id
+        self.compression = compression
+        self.bundle = bundle
+        # Names of all files in the current upload; compressed blobs avoid them
+        self.file_names = set()
         
         # Get the path to the favicon
         self.icon_path = os.path.join(os.path.dirname(__file__), '..', '..', 'assets', 'favicon.ico')
 
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise UploadCancelled("Upload cancelled")
+
+    def _progress_for(self, file_name):
+        """Return a bytes-sent callback for ``file_name``, or None without a listener."""
+        if self.progress_callback is None:
+            return None
+        return lambda bytes_sent: self.progress_callback(file_name, bytes_sent)
+
     def getHeaders(self):
         return {
             'Api-Key': self.workspace_key,
@@ -38,29 +360,76 @@ class Upload:
 
     def _make_request(self, method, endpoint, data=None):
         url = f"{self.BASE_URL}{endpoint}"
-        response = requests.request(str(method).upper(), url, headers=self.getHeaders(), json=data) 
-        response.raise_for_status()
+        with api_limiter.request(str(method).upper()):
+            response = get_session().request(
+                str(method).upper(), url, headers=self.getHeaders(), json=data,
+                timeout=_request_timeout()
+            )
+            response.raise_for_status()
         return response
 
     def create_workspace_container(self):
+        self._check_cancelled()
+        if self.resume_state is not None and self.resume_state.container_location:
+            # Resuming: keep writing to the container of the earlier attempt
+            self.container_location = self.resume_state.container_location
+            self.uploaded_files = []
+            self.manifest = UploadManifest()
+            self.close_container_client()
+            self.container_client = _container_client(self.container_location)
+            return
         timestamp = f'{datetime.now():%Y%m%d %H%M%S}'
         title = f'{timestamp} {self.workspace_name}'
         endpoint = f"/api/workspace/{self.workspace_name}/files/containers"
         url = f"{self.BASE_URL}{endpoint}"
     
         params = {'title': title}
-        response = requests.post(url, headers=self.getHeaders(), params=params)
-        response.raise_for_status()  
+        with api_limiter.request("create_container"):
+            response = get_session().post(
+                url, headers=self.getHeaders(), params=params, timeout=_request_timeout()
+            )
+            response.raise_for_status()
         self.container_location = response.headers['Location']
         self.uploaded_files = []  # Reset uploaded files list
-        
+        self.manifest = UploadManifest()
+        if self.resume_state is not None:
+            self.resume_state.set_container(self.container_location)
+        # Build the blob client once so every file2 call reuses its pipeline
+        # and pooled connections
+        self.close_container_client()
+        self.container_client = _container_client(self.container_location)
+
+    def _get_container_client(self):
+        if self.container_client is None:
+            self.container_client = _container_client(self.container_location)
+        return self.container_client
+
+    def close_container_client(self):
+        """Close the blob client of the current container, if any."""
+        if self.container_client is not None:
+            self.container_client.close()
+            self.container_client = None
+
     def commit_workspace_container(self):
+        self._check_cancelled()
         container_identifier = self.container_location.rsplit('/', 1)[-1]
         endpoint = f"/api/workspace/{self.workspace_name}/files/containers/{container_identifier}"
         url = f"{self.BASE_URL}{endpoint}"
     
-        response = requests.patch(url, headers=self.getHeaders())
-        response.raise_for_status()
+        try:
+            with api_limiter.request("commit_container"):
+                response = get_session().patch(
+                    url, headers=self.getHeaders(), timeout=_request_timeout()
+                )
+                response.raise_for_status()
+        finally:
+            self.close_container_client()
+        audit_log.record(
+            "container_committed", workspace_name=self.workspace_name, uploader_name=self.uploader,
+            container=container_identifier.split('?', 1)[0], files=len(self.uploaded_files)
+        )
+        if self.resume_state is not None:
+            self.resume_state.finish()
         return response
 
     def file2(self, local_file_path):
@@ -74,34 +443,379 @@ class Upload:
         # Log the file before upload
         self._log_upload(file_name)
         
-        container_client = ContainerClient.from_container_url(self.container_location)
+        self._check_cancelled()
+        size = os.path.getsize(local_file_path)
+        if self._record_committed(file_name, local_file_path, size):
+            return
+        container_client = self._get_container_client()
+        started = time.monotonic()
+        compression = compression_for(self.compression, local_file_path, self.file_names)
+        stored_size = None
+        if compression is not None:
+            sha256, stored_size = self._upload_compressed(
+                container_client, local_file_path, file_name, size, compression
+            )
+        elif size > settings.LARGE_FILE_THRESHOLD:
+            sha256 = self._upload_large_file(container_client, local_file_path, file_name)
+        else:
+            progress = self._progress_for(file_name)
+            # A single-shot upload_blob holds the whole file in memory
+            with memory_budget.reserve(size), open(local_file_path, "rb") as file_to_upload, \
+                    blob_limiter.request("upload_blob", size):
+                reader = HashingReader(file_to_upload)
+                container_client.upload_blob(
+                    file_name, reader, length=size, overwrite=True,
+                    progress_hook=(lambda current, total: progress(current)) if progress else None
+                )
+                sha256 = reader.hexdigest()
+        duration = time.monotonic() - started
+        if self.resume_state is not None:
+            self.resume_state.file_committed(
+                file_name, local_file_path, sha256, duration, compression, stored_size
+            )
+        self.record_upload(file_name, size, sha256, duration, compression, stored_size)
+
+    def _record_committed(self, file_name, local_file_path, size):
+        """Record the file and return True if an earlier attempt uploaded it."""
+        if self.resume_state is None:
+            return False
+        committed = self.resume_state.committed_file(file_name, local_file_path)
+        if committed is None:
+            return False
+        self.report_progress(file_name, size)
+        if committed.get("archive"):
+            self.manifest.add_archive(committed["archive"], self.compression, committed.get("archive_size"))
+        # The earlier attempt already added it to the upload history
+        self.record_upload(
+            file_name, size, committed["sha256"], committed["duration"],
+            committed.get("compression"), committed.get("stored_size"), committed.get("archive"),
+            history=False
+        )
+        return True
+
+    def upload_bundle(self, local_file_paths):
+        """
+        Upload files as one tar archive blob, compressed with the upload's
+        compression, and add each to the manifest with the archive's name.
+
+        Files are read once, straight into the archive stream. Files an
+        earlier attempt already uploaded are left out. Returns the name of
+        the archive, or None if there was nothing left to send.
+        """
+        pending = [
+            local_file_path for local_file_path in local_file_paths
+            if not self._record_committed(
+                os.path.basename(local_file_path), local_file_path, os.path.getsize(local_file_path)
+            )
+        ]
+        if not pending:
+            return None
+        name = bundle_name(self.compression)
+        added = []
+        with self.open_blob_writer(name, checksum=False, blob_name=name) as writer:
+            bundle = TarBundle(writer.write, self.compression)
+            for local_file_path in pending:
+                self._check_cancelled()
+                file_name = os.path.basename(local_file_path)
+                self._log_upload(file_name)
+                details = bundle.add(local_file_path)
+                added.append((local_file_path, file_name, details))
+                self.report_progress(file_name, details["size"])
+            bundle.close()
+        self.manifest.add_archive(name, self.compression, writer.bytes_written)
+        for local_file_path, file_name, details in added:
+            if self.resume_state is not None:
+                self.resume_state.file_committed(
+                    file_name, local_file_path, details["sha256"], details["duration"], archive=name,
+                    archive_size=writer.bytes_written
+                )
+            self.record_upload(
+                file_name, details["size"], details["sha256"], details["duration"], archive=name
+            )
+        return name
+
+    def _upload_compressed(self, container_client, local_file_path, file_name, size, compression):
+        """
+        Upload a file compressed on the fly as '<file_name><extension>'.
+
+        Small files are compressed in memory and sent in one request; larger
+        ones are read, compressed and staged block by block, so there is
+        never a compressed copy on disk. Progress counts bytes of the
+        original file. Returns the original's SHA-256 and the stored size.
+        """
+        compressor = StreamCompressor(compression)
+        blob_name = file_name + compressor.extension
+        progress = self._progress_for(file_name)
+        sha256 = hashlib.sha256()
+        if size <= settings.LARGE_FILE_THRESHOLD:
+            # The file and its compressed copy are both held in memory
+            with memory_budget.reserve(2 * size):
+                with open(local_file_path, "rb") as source:
+                    data = source.read()
+                sha256.update(data)
+                compressed = compressor.compress(data) + compressor.flush()
+                with blob_limiter.request("upload_blob", len(compressed)):
+                    container_client.upload_blob(blob_name, compressed, overwrite=True)
+            if progress is not None:
+                progress(size)
+            return sha256.hexdigest(), len(compressed)
+
+        blob_client = container_client.get_blob_client(blob_name)
+        with open(local_file_path, "rb") as source:
+            with BlockBlobWriter(blob_client, cancel_event=self.cancel_event, checksum=False) as writer:
+                while True:
+                    chunk = source.read(writer.block_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    writer.write(compressor.compress(chunk))
+                    if progress is not None:
+                        progress(compressor.bytes_in)
+                writer.write(compressor.flush())
+        return sha256.hexdigest(), writer.bytes_written
+
+    def record_upload(self, file_name, size, sha256=None, duration=None,
+                      compression=None, stored_size=None, archive=None, history=True):
+        """
+        Add an uploaded file to the container's manifest and, unless
+        ``history`` is False (a file restored from resume state), to the
+        upload history.
+        """
+        blob_name = file_name + EXTENSIONS[compression] if compression else None
+        self.manifest.add(file_name, size, sha256, duration, compression, stored_size, archive, blob_name)
+        self.uploaded_files.append(file_name)
+        details = {"compression": compression, "stored_size": stored_size} if compression else {}
+        if archive:
+            details["archive"] = archive
+        audit_log.record(
+            "upload_completed", workspace_name=self.workspace_name, uploader_name=self.uploader,
+            file_name=file_name, size=size, sha256=sha256, duration=duration, **details
+        )
+        if history:
+            history_store.record(
+                self.workspace_name, self.uploader, file_name, SUCCESS, size=size,
+                sha256=sha256, duration=duration, job_id=self.job_id
+            )
+
+    def record_failure(self, file_name, error, size=None):
+        """Add a failed file upload to the upload history."""
+        history_store.record(
+            self.workspace_name, self.uploader, file_name, ERROR, size=size,
+            error=str(error), job_id=self.job_id
+        )
+
+    def open_blob_writer(self, file_name, block_size=None, max_concurrency=None, checksum=True,
+                         blob_name=None, reserve_memory=True, on_block_staged=None):
+        """
+        Return a BlockBlobWriter for ``file_name`` in the current container.
+
+        Used to stream data that is not on local disk (e.g. a request body)
+        straight into a blob; closing the writer commits the blob and adds
+        it to the manifest. With ``checksum=False`` the writer does not hash
+        the data and the caller records the file with :meth:`record_upload`.
+        With ``blob_name`` the data (e.g. compressed) is stored under that
+        name, and progress is left to the caller via :meth:`report_progress`
+        since the bytes written are not the file's. ``reserve_memory`` and
+        ``on_block_staged`` are passed on to the writer.
+        """
+        self._check_cancelled()
+        self._log_upload(file_name)
+        blob_client = self._get_container_client().get_blob_client(blob_name or file_name)
+        on_commit = None
+        if checksum:
+            on_commit = lambda writer: self.record_upload(
+                file_name, writer.bytes_written, writer.sha256, writer.duration
+            )
+        return BlockBlobWriter(
+            blob_client, block_size, max_concurrency,
+            progress=self._progress_for(file_name) if blob_name is None else None,
+            cancel_event=self.cancel_event,
+            on_commit=on_commit, checksum=checksum, reserve_memory=reserve_memory,
+            on_block_staged=on_block_staged
+        )
+
+    def block_recorder(self, file_name, local_file_path, block_size):
+        """
+        Return an ``on_block_staged`` callback that records the file's blocks
+        in the resume state, or None without resume state.
+        """
+        if self.resume_state is None:
+            return None
+        # Sets the block size the recorded blocks are valid for
+        self.resume_state.staged_blocks(file_name, local_file_path, block_size)
+        return lambda current_id, offset, length: self.resume_state.block_staged(
+            file_name, current_id, offset, length
+        )
+
+    def upload_data(self, file_name, data, sha256=None, compression=None, size=None):
+        """
+        Upload an in-memory bytes payload as a blob and add it to the manifest.
+
+        For a payload already compressed with ``compression``, pass the
+        original's ``size`` and ``sha256``; the blob gets the format's
+        extension.
+        """
+        started = time.monotonic()
+        blob_name = file_name + EXTENSIONS[compression] if compression else file_name
+        self._put_blob(blob_name, data)
+        self.record_upload(
+            file_name, size if size is not None else len(data),
+            sha256 or hashlib.sha256(data).hexdigest(), time.monotonic() - started,
+            compression, len(data) if compression else None
+        )
+        self.report_progress(file_name, size if size is not None else len(data))
+
+    def report_progress(self, file_name, bytes_sent):
+        progress = self._progress_for(file_name)
+        if progress is not None:
+            progress(bytes_sent)
+
+    def _put_blob(self, file_name, data):
+        self._check_cancelled()
+        self._log_upload(file_name)
+        with blob_limiter.request("upload_blob", len(data)):
+            self._get_container_client().upload_blob(file_name, data, overwrite=True)
+
+    def upload_manifest(self):
+        """
+        Upload the manifest of the files uploaded so far.
+
+        Writes '<uploader>.txt' listing who uploaded which files with their
+        size, SHA-256 and upload time, and with ``MYDRE_MANIFEST_JSON`` the
+        same as '<uploader>.json'. Call once, just before committing.
+        Progress is reported in encoded bytes, as for any other file.
+        """
+        uploaded_on = datetime.now()
+        name = sanitize_filename(self.uploader)
+        manifests = {f"{name}.txt": self.manifest.to_text(self.uploader, uploaded_on).encode()}
+        if settings.MANIFEST_JSON:
+            manifests[f"{name}.json"] = self.manifest.to_json(
+                self.uploader, self.workspace_name, uploaded_on
+            ).encode()
+        for blob_name, data in manifests.items():
+            self._put_blob(blob_name, data)
+            self.report_progress(blob_name, len(data))
+
+    def _upload_large_file(self, container_client, local_file_path, file_name,
+                           block_size=None, max_concurrency=None):
+        """
+        Upload a file as blocks staged in parallel, then commit the block list.
+
+        When resuming, blocks recorded as staged that the server still holds
+        uncommitted are read for the checksum only, not sent again. Returns
+        the file's SHA-256.
+        """
+        block_size = block_size or settings.BLOCK_SIZE
+        blob_client = container_client.get_blob_client(file_name)
+        staged = {}
+        if self.resume_state is not None:
+            staged = self._staged_blocks(blob_client, file_name, local_file_path, block_size)
+        on_block_staged = self.block_recorder(file_name, local_file_path, block_size)
         with open(local_file_path, "rb") as file_to_upload:
-            container_client.upload_blob(file_name, file_to_upload, overwrite=True)
-            self.uploaded_files.append(file_name)
+            with BlockBlobWriter(blob_client, block_size, max_concurrency,
+                                 progress=self._progress_for(file_name),
+                                 cancel_event=self.cancel_event,
+                                 on_block_staged=on_block_staged) as writer:
+                index = 0
+                while True:
+                    block = file_to_upload.read(block_size)
+                    if not block:
+                        break
+                    if staged.get(block_id(index)) == len(block):
+                        writer.skip_block(block)
+                    else:
+                        writer.write(block)
+                    index += 1
+        return writer.sha256
 
-    def _log_upload(self, file_name):
-        """Log uploaded file with timestamp to a text file."""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = f"{timestamp} - Preparing to upload: {file_name} to workspace: {self.workspace_name}\n"
+    def _staged_blocks(self, blob_client, file_name, local_file_path, block_size):
+        """Blocks recorded for the file that the server still has uncommitted."""
+        recorded = self.resume_state.staged_blocks(file_name, local_file_path, block_size)
+        if not recorded:
+            return {}
         try:
-            with open(self.log_file_path, 'a', encoding='utf-8') as log_file:
-                log_file.write(log_entry)
+            _, uncommitted = blob_client.get_block_list('uncommitted')
         except Exception as e:
-            print(f"Warning: Could not write to log file: {e}")
+            logger.warning(f"Could not list staged blocks of {file_name}, uploading all: {str(e)}")
+            return {}
+        on_server = {block.id: block.size for block in uncommitted}
+        return {
+            current_id: length for current_id, length in recorded.items()
+            if on_server.get(current_id) == length
+        }
+
+    def upload_files(self, local_file_paths, max_workers=None):
+        """
+        Upload several files to the current container concurrently.
+
+        Every file is attempted; the result is one dict per file, in input
+        order, with ``status`` ``"success"`` or ``"error"`` (plus ``error``).
+        With bundling, small files go up in tar archives alongside the
+        others. The container is not committed, so the caller can decide
+        what to do once all uploads have finished.
+        """
+        # Callers may ask for fewer workers, never more than configured
+        max_workers = min(max_workers or settings.UPLOAD_WORKERS, settings.UPLOAD_WORKERS)
+        self.file_names = {os.path.basename(local_file_path) for local_file_path in local_file_paths}
+        if self.bundle:
+            bundles, singles = plan_bundles(local_file_paths)
+        else:
+            bundles, singles = [], local_file_paths
+
+        def succeeded(local_file_path):
+            entry = self.manifest.get(os.path.basename(local_file_path))
+            return {
+                "file": entry.filename,
+                "path": local_file_path,
+                "status": "success",
+                "size": entry.size,
+                "sha256": entry.sha256,
+                "compression": entry.compression,
+                "stored_size": entry.stored_size,
+                "archive": entry.archive
+            }
+
+        def failed(local_file_path, error):
+            file_name = os.path.basename(local_file_path)
+            self.record_failure(file_name, error)
+            return {"file": file_name, "path": local_file_path, "status": "error", "error": str(error)}
+
+        def upload_one(local_file_path):
+            try:
+                self.file2(local_file_path)
+                return [succeeded(local_file_path)]
+            except Exception as e:
+                return [failed(local_file_path, e)]
+
+        def upload_bundle(bundle):
+            try:
+                self.upload_bundle(bundle)
+                return [succeeded(local_file_path) for local_file_path in bundle]
+            except Exception as e:
+                return [failed(local_file_path, e) for local_file_path in bundle]
+
+        tasks = [(upload_bundle, bundle) for bundle in bundles] + [(upload_one, path) for path in singles]
+        results = {}
+        workers = max(1, min(max_workers, len(tasks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as executor:
+            for task_results in executor.map(lambda task: task[0](task[1]), tasks):
+                results.update((result["path"], result) for result in task_results)
+        return [results[local_file_path] for local_file_path in local_file_paths]
+
+    def _log_upload(self, file_name):
+        """Add a 'preparing to upload' record to the audit log."""
+        audit_log.record(
+            "upload_prepared", workspace_name=self.workspace_name,
+            uploader_name=self.uploader, file_name=file_name
+        )
 
     def get_uploaded_files(self):
         """Return the list of uploaded files."""
         return self.uploaded_files 
 
-    def get_upload_log(self):
-        """Read and return the contents of the upload log file."""
-        try:
-            if os.path.exists(self.log_file_path):
-                with open(self.log_file_path, 'r', encoding='utf-8') as log_file:
-                    return log_file.read()
-            return "No upload history found."
-        except Exception as e:
-            return f"Error reading upload log: {e}"
+    def get_upload_log(self, cursor=None, limit=100):
+        """Return a page of this workspace's audit log records, newest first."""
+        return audit_log.read(cursor, limit, workspace_name=self.workspace_name)
 
 
 